@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+""" Time constructing tasks with the resolve-aliases and scrape-ticket features on, with and without config snapshots.
+
+	python3 tools/config_bench.py
+	python3 tools/config_bench.py --tasks 5000 --aliases 1000
+
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import os
+import sys
+import time
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from worklog.config import Config
+from worklog.state import Task
+
+
+VALUES = {
+	'state': { 'store_filename_format': '{}.json', 'when_format': '%Y-%m-%d' },
+	'features': { 'resolve-aliases': True, 'scrape-ticket': True },
+	'jira': { 'projects': [ 'ABC', 'XY' ] },
+	'aliases': { 'mtg': 'Meeting', 'rev': 'Code review', 'code review': 'Reviewing' },
+}
+
+
+
+class Unresolved( Config ):
+	""" Every lookup goes through Config.__getattr__, the way it was before snapshots. """
+
+	def snapshot( self ):
+		return self
+
+
+
+def run( config, count ):
+	start = datetime( 2000, 1, 3 )
+	descriptions = ( 'mtg standup', 'rev ABC-{:d}', 'working on XY-{:d}', 'code review of XY-{:d}', 'lunch' )
+	began = time.perf_counter()
+	for index in range( count ):
+		Task(
+			start = start + timedelta( minutes = index ),
+			description = descriptions[index % len( descriptions )].format( index ),
+			logged = False,
+			config = config
+		)
+	return time.perf_counter() - began
+
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser( description = 'Benchmark task construction against the config' )
+	parser.add_argument( '--tasks', type = int, default = 20000 )
+	parser.add_argument( '--aliases', type = int, default = 0, help = 'add this many more aliases' )
+	args = parser.parse_args()
+	VALUES['aliases'].update( ( 'alias{:d}'.format( index ), 'Alias {:d}'.format( index ) ) for index in range( args.aliases ) )
+	for name, config in ( ( 'Config lookups', Unresolved( VALUES, {} ) ), ( 'snapshot', Config( VALUES, {} ) ) ):
+		elapsed = run( config, args.tasks )
+		print( '{:<16s} {:>8.1f}ms {:>8.2f}us/task'.format( name, elapsed * 1000, elapsed / args.tasks * 1000000 ) )
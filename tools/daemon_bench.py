@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+""" Time `worklog report` run in process and through a running `worklog daemon`.
+
+Everything runs against a throwaway home directory with a day of made up tasks, nothing touches ~/.worklog.
+
+	python3 tools/daemon_bench.py
+	python3 tools/daemon_bench.py --runs 50 --tasks 200
+
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+
+
+def make_home( home, tasks ):
+	directory = os.path.join( home, '.worklog' )
+	os.makedirs( directory )
+	with open( os.path.join( directory, 'config.json' ), 'w' ) as file_handle:
+		json.dump( {
+			'state': { 'store_filename_format': os.path.join( directory, '{}.json' ), 'when_format': '%Y-%m-%d' },
+			'features': { 'colorize': False },
+			'jira': {},
+			'aliases': { 'lunch': 'Lunch' }
+		}, file_handle )
+	for index in range( tasks ):
+		start = '{:02d}:{:02d}'.format( index * 10 // 60 % 24, index * 10 % 60 )
+		command( home, 'worklog', 'start', '--day', '2000-01-03', '--at', start, '-t', 'BENCH-{:d}'.format( index % 7 ), 'task {:d}'.format( index ) )
+
+
+
+def command( home, module, *argv ):
+	env = dict( os.environ, HOME = home, PYTHONPATH = ROOT )
+	env.pop( 'WORKLOG_SOCKET', None )
+	start = time.perf_counter()
+	subprocess.run( [ sys.executable ] + ( [ '-m', module ] if module else [ '-c', 'pass' ] ) + list( argv ), env = env, stdout = subprocess.DEVNULL, check = True )
+	return ( time.perf_counter() - start ) * 1000
+
+
+
+def measure( home, module, runs ):
+	argv = ( 'report', '--day', '2000-01-03' ) if module else ()
+	timings = [ command( home, module, *argv ) for _ in range( runs ) ]
+	return statistics.median( timings ), min( timings ), max( timings )
+
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser( description = 'Benchmark worklog report with and without the daemon' )
+	parser.add_argument( '--runs', type = int, default = 20 )
+	parser.add_argument( '--tasks', type = int, default = 40 )
+	args = parser.parse_args()
+	with tempfile.TemporaryDirectory() as home:
+		make_home( home, args.tasks )
+		results = [
+			( 'python startup', measure( home, None, args.runs ) ),
+			( 'python -m worklog', measure( home, 'worklog', args.runs ) ),
+			( 'client, no daemon', measure( home, 'worklog.client', args.runs ) ),
+		]
+		env = dict( os.environ, HOME = home, PYTHONPATH = ROOT )
+		daemon = subprocess.Popen( [ sys.executable, '-m', 'worklog', 'daemon' ], env = env, stdout = subprocess.PIPE )
+		try:
+			daemon.stdout.readline()
+			results.append( ( 'client, daemon', measure( home, 'worklog.client', args.runs ) ) )
+		finally:
+			daemon.terminate()
+			daemon.wait()
+	print( '{:<20s} {:>10s} {:>10s} {:>10s}'.format( 'path', 'median', 'min', 'max' ) )
+	for name, ( median, fastest, slowest ) in results:
+		print( '{:<20s} {:>8.1f}ms {:>8.1f}ms {:>8.1f}ms'.format( name, median, fastest, slowest ) )
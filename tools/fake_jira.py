@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+""" A stand-in for the bits of the Jira REST API worklog uploads use, for trying out upload changes safely.
+
+Serves serverInfo, myself, issue GETs and worklog GETs/POSTs from memory, every issue exists. Latency, random server
+errors and a per second rate limit (answered with 429s) can be injected. With --require-auth, requests need either
+basic auth (any credentials, answered with a session cookie) or a live session cookie. Worklogs are posted as
+whoever the request authenticated as, so reconcile can tell them apart from other people's.
+
+	python3 tools/fake_jira.py --port 8080 --latency 0.05 --error-rate 0.05 --rate-limit 20
+
+"""
+
+import argparse
+import base64
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+
+API_RE = re.compile( r'^/rest/api/(?:2|latest)/(?P<path>.*)$' )
+ISSUE_RE = re.compile( r'^issue/(?P<key>[^/]+)$' )
+WORKLOG_RE = re.compile( r'^issue/(?P<key>[^/]+)/worklog$' )
+
+
+
+class FakeJira:
+
+	def __init__( self, port = 0, latency = 0, error_rate = 0, rate_limit = None, seed = None, require_auth = False ):
+		self.require_auth = require_auth
+		self.sessions = {}
+		self.latency = latency
+		self.error_rate = error_rate
+		self.rate_limit = rate_limit
+		self.random = random.Random( seed )
+		self.worklogs = {}
+		self.stats = {}
+		self._lock = threading.Lock()
+		self._tokens = rate_limit or 0
+		self._refilled = time.monotonic()
+		self._server = ThreadingHTTPServer( ( '127.0.0.1', port ), _handler( self ) )
+		self._server.daemon_threads = True
+		self._thread = None
+
+	@property
+	def url( self ):
+		return 'http://127.0.0.1:{:d}'.format( self._server.server_address[1] )
+
+	def start( self ):
+		self._thread = threading.Thread( target = self._server.serve_forever, daemon = True )
+		self._thread.start()
+		return self
+
+	def stop( self ):
+		self._server.shutdown()
+		self._server.server_close()
+
+	def __enter__( self ):
+		return self.start()
+
+	def __exit__( self, *err ):
+		self.stop()
+
+	def count( self, name ):
+		with self._lock:
+			self.stats[name] = self.stats.get( name, 0 ) + 1
+
+	def authenticate( self, headers ):
+		""" The new session id if a request with `headers` is allowed in but had no session yet, otherwise None. """
+		with self._lock:
+			if _session( headers ) in self.sessions:
+				return None
+			username = _basic_username( headers )
+			if username is not None:
+				session = '{:032x}'.format( self.random.getrandbits( 128 ) )
+				self.sessions[session] = username
+				return session
+		raise PermissionError()
+
+	def expire_sessions( self ):
+		with self._lock:
+			self.sessions = {}
+
+	def username( self, headers ):
+		""" Who a request with `headers` is from, by its basic auth or its session, 'fake' if it doesn't say. """
+		with self._lock:
+			return _basic_username( headers ) or self.sessions.get( _session( headers ) ) or 'fake'
+
+	def throttled( self ):
+		""" Token bucket, `rate_limit` requests per second with bursts of up to that many. """
+		if not self.rate_limit:
+			return False
+		with self._lock:
+			now = time.monotonic()
+			self._tokens = min( self.rate_limit, self._tokens + ( now - self._refilled ) * self.rate_limit )
+			self._refilled = now
+			if self._tokens < 1:
+				return True
+			self._tokens -= 1
+			return False
+
+	def issue( self, key ):
+		number = key.rsplit( '-', 1 )[-1]
+		return {
+			'id': number if number.isdigit() else str( abs( hash( key ) ) ),
+			'key': key,
+			'self': '{}/rest/api/2/issue/{}'.format( self.url, key ),
+			'fields': { 'summary': 'Summary of {}'.format( key ) }
+		}
+
+	def add_worklog( self, key, body, username = 'fake' ):
+		with self._lock:
+			worklogs = self.worklogs.setdefault( key, [] )
+			worklog_id = str( sum( len( x ) for x in self.worklogs.values() ) + 1 )
+			worklog = {
+				'id': worklog_id,
+				'self': '{}/rest/api/2/issue/{}/worklog/{}'.format( self.url, key, worklog_id ),
+				'issueId': self.issue( key )['id'],
+				'author': { 'name': username, 'displayName': username },
+				'started': body.get( 'started' ),
+				'timeSpent': body.get( 'timeSpent' ),
+				'timeSpentSeconds': _seconds( body.get( 'timeSpent' ) or '' ) if 'timeSpentSeconds' not in body else int( body['timeSpentSeconds'] ),
+				'comment': body.get( 'comment', '' )
+			}
+			worklogs.append( worklog )
+		return worklog
+
+
+
+def _session( headers ):
+	cookies = dict( part.strip().split( '=', 1 ) for part in ( headers.get( 'Cookie' ) or '' ).split( ';' ) if '=' in part )
+	return cookies.get( 'JSESSIONID' )
+
+
+
+def _basic_username( headers ):
+	authorization = headers.get( 'Authorization' ) or ''
+	if not authorization.startswith( 'Basic ' ):
+		return None
+	return base64.b64decode( authorization[len( 'Basic ' ):] ).decode().split( ':', 1 )[0]
+
+
+
+def _seconds( time_spent ):
+	factors = { 'w': 5 * 8 * 3600, 'd': 8 * 3600, 'h': 3600, 'm': 60 }
+	return sum( int( float( amount ) * factors[unit] ) for amount, unit in re.findall( r'(\d+(?:\.\d+)?)([wdhm])', time_spent ) )
+
+
+
+def _handler( fake ):
+
+	class Handler( BaseHTTPRequestHandler ):
+
+		protocol_version = 'HTTP/1.1'
+
+		def log_message( self, *args ):
+			pass
+
+		def _reply( self, status, body = None, headers = None ):
+			data = json.dumps( body if body is not None else {} ).encode()
+			self.send_response( status )
+			self.send_header( 'Content-Type', 'application/json' )
+			self.send_header( 'Content-Length', str( len( data ) ) )
+			for name, value in ( headers or {} ).items():
+				self.send_header( name, value )
+			if getattr( self, '_cookie', None ):
+				self.send_header( 'Set-Cookie', self._cookie )
+				self._cookie = None
+			self.end_headers()
+			self.wfile.write( data )
+
+		def _route( self, method ):
+			length = int( self.headers.get( 'Content-Length' ) or 0 )
+			body = json.loads( self.rfile.read( length ) or b'{}' ) if length else {}
+			match = API_RE.match( urlparse( self.path ).path )
+			if not match:
+				fake.count( 'not found' )
+				return self._reply( 404, { 'errorMessages': [ 'not found' ] } )
+			if fake.latency:
+				time.sleep( fake.latency )
+			if fake.throttled():
+				fake.count( 'throttled' )
+				return self._reply( 429, { 'errorMessages': [ 'rate limit exceeded' ] }, { 'Retry-After': '1' } )
+			if fake.error_rate and fake.random.random() < fake.error_rate:
+				fake.count( 'errors' )
+				return self._reply( 503, { 'errorMessages': [ 'injected failure' ] } )
+			path = match.group( 'path' )
+			if fake.require_auth:
+				try:
+					session = fake.authenticate( self.headers )
+				except PermissionError:
+					fake.count( 'unauthorized' )
+					return self._reply( 401, { 'errorMessages': [ 'not logged in' ] } )
+				if session:
+					fake.count( 'logins' )
+					self._cookie = 'JSESSIONID={}; Path=/'.format( session )
+			if method == 'GET' and path == 'serverInfo':
+				fake.count( 'serverInfo' )
+				return self._reply( 200, { 'versionNumbers': [ 8, 0, 0 ], 'deploymentType': 'Server', 'baseUrl': fake.url } )
+			if method == 'GET' and path == 'myself':
+				fake.count( 'myself' )
+				username = fake.username( self.headers )
+				return self._reply( 200, { 'name': username, 'displayName': username } )
+			worklog_match = WORKLOG_RE.match( path )
+			if worklog_match and method == 'POST':
+				fake.count( 'add worklog' )
+				return self._reply( 201, fake.add_worklog( worklog_match.group( 'key' ), body, fake.username( self.headers ) ) )
+			if worklog_match and method == 'GET':
+				fake.count( 'worklogs' )
+				worklogs = fake.worklogs.get( worklog_match.group( 'key' ), [] )
+				return self._reply( 200, { 'startAt': 0, 'maxResults': len( worklogs ), 'total': len( worklogs ), 'worklogs': worklogs } )
+			issue_match = ISSUE_RE.match( path )
+			if issue_match and method == 'GET':
+				fake.count( 'issue' )
+				return self._reply( 200, fake.issue( issue_match.group( 'key' ) ) )
+			fake.count( 'not found' )
+			return self._reply( 404, { 'errorMessages': [ 'not found' ] } )
+
+		def do_GET( self ):
+			self._route( 'GET' )
+
+		def do_POST( self ):
+			self._route( 'POST' )
+
+	return Handler
+
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser( description = 'Serve a fake Jira for worklog uploads' )
+	parser.add_argument( '--port', type = int, default = 8080 )
+	parser.add_argument( '--latency', type = float, default = 0, help = 'seconds to wait before answering each request' )
+	parser.add_argument( '--error-rate', type = float, default = 0, help = 'fraction of requests answered with a 503' )
+	parser.add_argument( '--rate-limit', type = float, default = None, help = 'requests per second before answering with 429s' )
+	parser.add_argument( '--require-auth', default = False, action = 'store_true', help = 'answer requests without credentials or a session with 401s' )
+	args = parser.parse_args()
+	fake = FakeJira( port = args.port, latency = args.latency, error_rate = args.error_rate, rate_limit = args.rate_limit, require_auth = args.require_auth )
+	print( 'Fake jira listening on {}'.format( fake.url ) )
+	try:
+		fake._server.serve_forever()
+	except KeyboardInterrupt:
+		print( fake.stats )
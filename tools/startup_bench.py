@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+""" Check what `worklog report` spends on imports, with python -X importtime, against a budget.
+
+Fails when the imports take longer than the budget, or when they pull in anything only other commands need (the jira
+client, sqlite, asyncio, ...). Runs against a throwaway home directory with a day of made up tasks, nothing touches
+~/.worklog.
+
+	python3 tools/startup_bench.py
+	python3 tools/startup_bench.py --budget 20 --runs 20
+
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+ROOT = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+DEFAULT_BUDGET = 30
+# only imported by the commands that need them, never by report
+FORBIDDEN = ( 'jira', 'requests', 'oauthlib', 'urllib3', 'sqlite3', 'asyncio', 'concurrent.futures', 'http.client', 'pprint' )
+
+
+
+def make_home( home, tasks ):
+	directory = os.path.join( home, '.worklog' )
+	os.makedirs( directory )
+	with open( os.path.join( directory, 'config.json' ), 'w' ) as file_handle:
+		json.dump( {
+			'state': { 'store_filename_format': os.path.join( directory, '{}.json' ), 'when_format': '%Y-%m-%d' },
+			'features': { 'colorize': False },
+			'jira': {},
+			'aliases': { 'lunch': 'Lunch' }
+		}, file_handle )
+	for index in range( tasks ):
+		start = '{:02d}:{:02d}'.format( 8 + index // 6, index % 6 * 10 )
+		worklog( home, 'start', '--at', start, '-t', 'BENCH-{:d}'.format( index % 7 ), 'task {:d}'.format( index ) )
+
+
+
+def worklog( home, *args, importtime = False ):
+	command = [ sys.executable ] + ( [ '-X', 'importtime' ] if importtime else [] ) + [ '-m', 'worklog' ] + list( args )
+	return subprocess.run(
+		command,
+		cwd = ROOT,
+		env = dict( os.environ, HOME = home ),
+		stdout = subprocess.DEVNULL,
+		stderr = subprocess.PIPE,
+		universal_newlines = True,
+		check = True
+	).stderr
+
+
+
+def imports( output ):
+	""" Each imported module with its cumulative import time in microseconds and how deeply it is nested. """
+	modules = []
+	for line in output.splitlines():
+		if not line.startswith( 'import time:' ) or 'cumulative' in line:
+			continue
+		_, cumulative, name = line.split( '|' )
+		modules.append( ( name.strip(), int( cumulative ), len( name ) - len( name.lstrip() ) - 1 ) )
+	return modules
+
+
+
+def measure( home ):
+	""" Milliseconds spent importing from the worklog package on (python's own startup aside) and every module name. """
+	modules = imports( worklog( home, 'report', importtime = True ) )
+	names = [ name for name, _, _ in modules ]
+	first = names.index( 'worklog' )
+	total = sum( cumulative for _, cumulative, depth in modules[first:] if depth == 0 )
+	return total / 1000, set( names )
+
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser( description = 'Check the import time of worklog report against a budget' )
+	parser.add_argument( '--budget', type = float, default = DEFAULT_BUDGET, help = 'milliseconds (default: %(default)s)' )
+	parser.add_argument( '--runs', type = int, default = 10 )
+	parser.add_argument( '--tasks', type = int, default = 20 )
+	args = parser.parse_args()
+	with tempfile.TemporaryDirectory() as home:
+		make_home( home, args.tasks )
+		runs = [ measure( home ) for _ in range( args.runs ) ]
+	median = statistics.median( total for total, _ in runs )
+	loaded = set().union( *( names for _, names in runs ) )
+	unwanted = sorted( name for name in loaded if any( name == module or name.startswith( module + '.' ) for module in FORBIDDEN ) )
+	print( 'worklog report imports: {:.1f}ms median of {:d} runs (budget {:.0f}ms)'.format( median, args.runs, args.budget ) )
+	if unwanted:
+		print( 'Imported modules report does not need: {}'.format( ', '.join( unwanted ) ) )
+	if median > args.budget or unwanted:
+		sys.exit( 1 )
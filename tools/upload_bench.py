@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+""" Time worklog uploads of days with 10, 100 and 1000 ticketed segments against tools/fake_jira.py.
+
+Each scenario gets a fresh day, outbox and issue cache in a temporary directory, nothing touches ~/.worklog.
+
+	python3 tools/upload_bench.py
+	python3 tools/upload_bench.py --sizes 100 --scenarios latency errors --concurrency 8
+
+"""
+
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+sys.path.insert( 0, os.path.dirname( os.path.abspath( __file__ ) ) )
+
+from fake_jira import FakeJira
+from worklog.config import Config
+from worklog.state import Worklog, Task, GoHome
+from worklog.upload import log_to_jira
+
+
+SCENARIOS = {
+	'clean': {},
+	'latency': { 'latency': 0.02 },
+	'errors': { 'latency': 0.02, 'error_rate': 0.05 },
+	'throttled': { 'latency': 0.02, 'rate_limit': 50 },
+}
+
+
+
+def make_config( directory, server, args ):
+	return Config( {
+		'state': {
+			'store_filename_format': os.path.join( directory, '{}.json' ),
+			'when_format': '%Y-%m-%d',
+			'manifest': os.path.join( directory, 'manifest.json' ),
+			'rollup_cache': os.path.join( directory, 'rollup-cache.json' ),
+			'recent': os.path.join( directory, 'recent.sqlite' ),
+			'search_index': os.path.join( directory, 'search.sqlite' ),
+		},
+		'features': {},
+		'jira': {
+			'server': server,
+			'username': 'bench',
+			'password': 'bench',
+			'auth': 'basic',
+			'concurrency': args.concurrency,
+			'retries': args.retries,
+			'backoff': args.backoff,
+			'outbox': os.path.join( directory, 'outbox.jsonl' ),
+			'issue_cache': os.path.join( directory, 'issue-cache.json' ),
+			'session_cache': os.path.join( directory, 'jira-session.json' ),
+		},
+		'aliases': {},
+	}, {} )
+
+
+
+def make_day( config, size, tickets ):
+	day = datetime( 2000, 1, 3 )
+	with Worklog( when = day.date(), config = config ) as worklog:
+		worklog.extend(
+			Task( start = day + timedelta( minutes = index ), ticket = 'BENCH-{:d}'.format( index % tickets + 1 ), description = 'segment {:d}'.format( index ), logged = False )
+			for index in range( size )
+		)
+		worklog.insert( GoHome( start = day + timedelta( minutes = size ) ) )
+	return day.date()
+
+
+
+def run( size, scenario, args ):
+	with tempfile.TemporaryDirectory() as directory, FakeJira( seed = 0, **SCENARIOS[scenario] ) as fake:
+		config = make_config( directory, fake.url, args )
+		day = make_day( config, size, max( 1, size // args.segments_per_ticket ) )
+		output = io.StringIO()
+		start = time.perf_counter()
+		with redirect_stdout( output ), Worklog( when = day, config = config ) as worklog:
+			log_to_jira( worklog, config, coalesce = args.coalesce )
+		elapsed = time.perf_counter() - start
+		logged = sum( 1 for task in worklog if task.logged and not isinstance( task, GoHome ) )
+		posted = sum( len( worklogs ) for worklogs in fake.worklogs.values() )
+		requests = sum( fake.stats.values() )
+	print( '{:>6d} {:>10s} {:>8.2f}s {:>8.1f}/s {:>8d} {:>8d} {:>8d} {:>8d} {:>8d}'.format(
+		size,
+		scenario,
+		elapsed,
+		posted / elapsed,
+		requests,
+		posted,
+		logged,
+		fake.stats.get( 'errors', 0 ),
+		fake.stats.get( 'throttled', 0 )
+	) )
+
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser( description = 'Benchmark worklog uploads against a fake jira' )
+	parser.add_argument( '--sizes', type = int, nargs = '+', default = [ 10, 100, 1000 ] )
+	parser.add_argument( '--scenarios', nargs = '+', choices = sorted( SCENARIOS ), default = sorted( SCENARIOS ) )
+	parser.add_argument( '--concurrency', type = int, default = 4 )
+	parser.add_argument( '--retries', type = int, default = 5 )
+	parser.add_argument( '--backoff', type = float, default = 0.1 )
+	parser.add_argument( '--segments-per-ticket', type = int, default = 5 )
+	parser.add_argument( '--coalesce', default = False, action = 'store_true' )
+	args = parser.parse_args()
+	print( '{:>6s} {:>10s} {:>9s} {:>10s} {:>8s} {:>8s} {:>8s} {:>8s} {:>8s}'.format(
+		'tasks', 'scenario', 'time', 'posts', 'requests', 'posted', 'logged', 'errors', 'throttled'
+	) )
+	for size in args.sizes:
+		for scenario in args.scenarios:
+			run( size, scenario, args )
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+""" Time one command's worth of writing (load a day, add a task, save it) with 10, 1k and 10k tasks in the day.
+
+Each storage backend gets a fresh day in a temporary directory, nothing touches ~/.worklog.
+
+	python3 tools/write_bench.py
+	python3 tools/write_bench.py --sizes 1000 --storage json journal --runs 50
+
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from worklog.config import Config
+from worklog.state import Worklog, Task
+
+
+STORAGES = ( 'json', 'journal', 'sqlite' )
+DAY = datetime( 2000, 1, 3 )
+
+
+
+def make_config( directory, storage ):
+	return Config( {
+		'state': {
+			'storage': storage,
+			'store_filename_format': os.path.join( directory, '{}.json' ),
+			'when_format': '%Y-%m-%d',
+			'database': os.path.join( directory, 'worklog.sqlite' ),
+			'manifest': os.path.join( directory, 'manifest.json' ),
+			'rollup_cache': os.path.join( directory, 'rollup-cache.json' ),
+			'recent': os.path.join( directory, 'recent.sqlite' ),
+			'search_index': os.path.join( directory, 'search.sqlite' ),
+		},
+		'features': {},
+		'jira': {},
+		'aliases': {},
+	}, {} )
+
+
+
+def make_day( config, size ):
+	with Worklog( when = DAY.date(), config = config ) as worklog:
+		worklog.extend(
+			Task( start = DAY + timedelta( seconds = index ), ticket = 'BENCH-{:d}'.format( index % 50 ), description = 'task {:d}'.format( index ), logged = False )
+			for index in range( size )
+		)
+
+
+
+def run( size, storage, runs ):
+	""" Median milliseconds for the whole command and for just the save. """
+	with tempfile.TemporaryDirectory() as directory:
+		config = make_config( directory, storage )
+		make_day( config, size )
+		commands = []
+		saves = []
+		for index in range( runs ):
+			began = time.perf_counter()
+			worklog = Worklog( when = DAY.date(), config = config )
+			worklog.load()
+			worklog.insert( Task( start = DAY + timedelta( hours = 12, seconds = index ), ticket = 'BENCH-1', description = 'more', logged = False ) )
+			saving = time.perf_counter()
+			worklog.dump()
+			done = time.perf_counter()
+			commands.append( done - began )
+			saves.append( done - saving )
+	return statistics.median( commands ) * 1000, statistics.median( saves ) * 1000
+
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser( description = 'Benchmark the cost of saving a day per command' )
+	parser.add_argument( '--sizes', type = int, nargs = '+', default = [ 10, 1000, 10000 ] )
+	parser.add_argument( '--storage', nargs = '+', choices = STORAGES, default = STORAGES )
+	parser.add_argument( '--runs', type = int, default = 20 )
+	args = parser.parse_args()
+	print( '{:>6s} {:>8s} {:>10s} {:>10s}'.format( 'tasks', 'storage', 'command', 'save' ) )
+	for size in args.sizes:
+		for storage in args.storage:
+			command, save = run( size, storage, args.runs )
+			print( '{:>6d} {:>8s} {:>8.2f}ms {:>8.2f}ms'.format( size, storage, command, save ) )
@@ -1,3 +1,3 @@
 #!/bin/bash
 
-python3 -m worklog $@
+python3 -m worklog.client $@
@@ -1,12 +1,38 @@
 
 import os
 
-CONFIG_PATH = os.path.expanduser( '~/.worklog/config.json' )
+WORKLOG_DIR = os.path.expanduser( '~/.worklog' )
+CONFIG_PATH = os.path.join( WORKLOG_DIR, 'config.json' )
 
 
 NO_ROLLUP_KEYWORDS = ( 'lunch', 'break' )
 
 
+
+def file_signature( *filenames ):
+	""" The mtime and size of each file (None if it's missing), to tell whether someone changed them since. """
+	signature = []
+	for filename in filenames:
+		try:
+			stat = os.stat( filename )
+		except FileNotFoundError:
+			signature.append( None )
+		else:
+			signature.append( [ stat.st_mtime_ns, stat.st_size ] )
+	return signature
+
+
+
+def write_atomically( filename, text, mode = 0o666 ):
+	""" Replace `filename` with `text` in one step, whoever reads it sees the old or the new file but never half of one. """
+	os.makedirs( os.path.dirname( filename ), exist_ok = True )
+	temp_filename = filename + '.tmp'
+	descriptor = os.open( temp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode )
+	with os.fdopen( descriptor, 'w' ) as file_handle:
+		file_handle.write( text )
+	os.replace( temp_filename, filename )
+
+
 class Usage( Exception ):
 	
 	def __init__( self, section = None ):
@@ -1,18 +1,24 @@
 
 import argparse
-from collections import Callable
+from datetime import timedelta
 import os
+import subprocess
+import sys
 
+from worklog import WORKLOG_DIR
 from worklog import alias
 from worklog import color
 from worklog.config import ConfigFile
+from worklog.manifest import Manifest
+from worklog.recent import RecentDescriptions
 from worklog.report import Report
-from worklog.state import Worklog, Task, GoHome, Abort
-from worklog.time_utils import resolve_at_or_ago
-from worklog.upload import log_to_jira
+from worklog.state import Worklog, WorklogRange, Task, GoHome, Abort, history, resolve_day
+from worklog.time_utils import Duration, now, resolve_at_or_ago
 
 
 CONFIG_PATH = '~/.worklog/config.json'
+RESUME_CHOICES = 20
+SEARCH_RESULTS = 20
 EPILOG = '''\
 DURATIONs
   Spans of time can be provided in a concise format, a series of integers or
@@ -49,7 +55,7 @@ Config File:
 
   WARNING:
 	Uploading multiple times in one calendar day will cause inconsistencies with time tracking
-	on the server side.
+	on the server side. Use "upload --reconcile" to only post what isn't on the server yet.
 '''
 
 
@@ -71,17 +77,23 @@ def on_start( args, config ):
 
 
 def on_resume( args, config ):
-	with Worklog( when = args.day, config = config ) as worklog:
+	recent = RecentDescriptions( config )
+	if not recent.exists:
+		print( 'Indexing past descriptions ...' )
+		recent.reindex()
+	with Worklog( when = args.day, config = config ) as worklog, recent:
 		start = resolve_at_or_ago( args, date = worklog.when )
-		descriptions = list()
-		for description in reversed( [ task.description for task in worklog if isinstance( task, Task ) ] ):
-			if description not in descriptions:
-				descriptions.append( description )
-		# when using resume, it means we're no longer working on the description that is now the first
-		# item in this list, because of how we've sorted it. It is quite inconvenient for the first
-		# choice to be the one we know for sure the user won't pick, bump it to the end of the line
-		most_recent_description = descriptions.pop( 0 )
-		descriptions.append( most_recent_description )
+		descriptions = recent.choices( search = args.search )
+		if not descriptions:
+			print( 'No descriptions match "{}".'.format( args.search ) if args.search else 'Nothing to resume yet.' )
+			raise Abort()
+		# when using resume, it means we're no longer working on the task that is open right now. It is
+		# quite inconvenient for the first choice to be the one we know for sure the user won't pick, bump
+		# it to the end of the line
+		if not args.search:
+			descriptions = descriptions[:RESUME_CHOICES]
+		if len( worklog ) and not isinstance( worklog[-1], GoHome ) and worklog[-1].description == descriptions[0]:
+			descriptions.append( descriptions.pop( 0 ) )
 		for idx, description in enumerate( descriptions ):
 			print( '[{:d}] {}'.format( idx, description ) )
 		description = None
@@ -89,15 +101,13 @@ def on_resume( args, config ):
 			try:
 				idx = int( input( "Which description: " ) )
 				description = descriptions[idx]
-				for task in worklog:
-					if task.description == description:
-						ticket = task.ticket
+				ticket = recent.get( description )['ticket']
 			except KeyboardInterrupt:
 				raise Abort()
 			except EOFError:
 				raise Abort()
 			except ( ValueError, IndexError ):
-				print( 'Must be an integer between 0 and {:d}'.format( len( descriptions ) ) )
+				print( 'Must be an integer between 0 and {:d}'.format( len( descriptions ) - 1 ) )
 		worklog.insert( Task( start = start, ticket = ticket, description = description, logged = True, config = config ) )
 	print( Report( worklog, config ) )
 
@@ -111,14 +121,148 @@ def on_stop( args, config ):
 
 
 def on_report( args, config ):
+	if args.from_day or args.to_day:
+		report = Report( WorklogRange( args.from_day or args.to_day, args.to_day, config = config ), config, summary = args.summary )
+		print( report )
+		if args.cache_stats and report.rollup_cache:
+			print( report.rollup_cache )
+		return None
 	with Worklog( when = args.day, config = config ) as worklog:
-		print( Report( worklog, config ) )
+		print( Report( worklog, config, summary = args.summary ) )
+
+
+
+def on_status( args, config ):
+	from worklog import status
+	print( status.show( args.format ) )
+
+
+
+def on_compact( args, config ):
+	worklog = Worklog( when = args.day, config = config )
+	if not worklog.journaled:
+		# any other storage has no journal, compacting would only leave a stray worklog file behind
+		print( 'Only journal storage has anything to compact.' )
+		raise Abort()
+	with worklog:
+		worklog.compact()
+
+
+
+def on_migrate( args, config ):
+	from worklog import database
+	print( 'Importing worklog files into {} ...'.format( database.database_filename( config ) ) )
+	print( 'Imported {:d} days.'.format( database.import_day_files( config ) ) )
+
+
+
+def on_backfill_tickets( args, config ):
+	from worklog import tickets
+	if args.from_day or args.to_day:
+		days = WorklogRange( args.from_day or args.to_day, args.to_day, config = config ).days()
+	else:
+		days = history( config )
+	changed, days_changed, seconds = tickets.backfill( config, days, dry_run = args.dry_run )
+	print( '{} {:d} tickets on {:d} days in {:.2f}s.'.format(
+		'Would fill in' if args.dry_run else 'Filled in',
+		changed,
+		days_changed,
+		seconds
+	) )
+
+
+
+def on_search( args, config ):
+	from worklog.search import SearchIndex
+	search_index = SearchIndex( config )
+	if not search_index.exists:
+		print( 'Indexing worklog history ...' )
+		search_index.reindex()
+	with search_index:
+		results = search_index.search( ' '.join( args.words ) )
+	if not results:
+		print( 'Nothing matches "{}".'.format( ' '.join( args.words ) ) )
+		return None
+	shown = len( results ) if not args.limit else min( args.limit, len( results ) )
+	total = timedelta()
+	for index, ( start, seconds, ticket, description ) in enumerate( results ):
+		delta = _segment_duration( start, seconds )
+		total += delta
+		if index < shown:
+			print( '{} {}  {:>7}  {}  {}'.format(
+				start.strftime( '%Y-%m-%d' ),
+				start.strftime( '%H:%M' ),
+				str( Duration( delta ) ) or '0m',
+				ticket or '-',
+				description
+			) )
+	print( '{:d} of {:d} matching entries, {} in total.'.format( shown, len( results ), str( Duration( total ) ) or '0m' ) )
+
+
+
+def _segment_duration( start, seconds ):
+	if seconds is None:
+		# still open, it has been going on until now
+		return max( now() - start, timedelta() )
+	return timedelta( seconds = seconds )
+
+
+
+def on_reindex( args, config ):
+	with Manifest( config ) as manifest:
+		print( 'Indexed {:d} days.'.format( manifest.reindex() ) )
+	with RecentDescriptions( config ) as recent:
+		recent.reindex()
+	from worklog.search import SearchIndex
+	with SearchIndex( config ) as search_index:
+		search_index.reindex()
 
 
 
 def on_upload( args, config ):
+	if args.drain:
+		drain( args, config )
+		return None
+	if args.reconcile:
+		from worklog.upload import reconcile
+		worklog_range = WorklogRange( args.from_day or args.to_day or args.day, args.to_day or args.day, config = config )
+		reconcile( worklog_range, config, coalesce = args.coalesce, dry_run = args.dry_run )
+		return None
+	if args.from_day or args.to_day:
+		from worklog.pipeline import upload_range
+		upload_range( WorklogRange( args.from_day or args.to_day, args.to_day, config = config ), config, coalesce = args.coalesce )
+		return None
+	summary = Manifest( config ).load().get( resolve_day( args.day ) )
+	if summary is not None and not summary['unlogged']:
+		print( 'Nothing to upload.' )
+		return None
+	# the jira client and everything it pulls in is slow to import, only pay for it when uploading
+	from worklog.upload import log_to_jira
 	with Worklog( when = args.day, config = config ) as worklog:
-		log_to_jira( worklog, config )
+		log_to_jira( worklog, config, coalesce = args.coalesce )
+
+
+def drain( args, config ):
+	if not args.foreground:
+		# hand the queue off to a detached copy of ourselves so the shell gets control back right away
+		log_filename = os.path.join( WORKLOG_DIR, 'outbox.log' )
+		with open( log_filename, 'a' ) as log_file:
+			subprocess.Popen(
+				[ sys.executable, '-m', 'worklog', 'upload', '--drain', '--foreground' ],
+				stdin = subprocess.DEVNULL,
+				stdout = log_file,
+				stderr = subprocess.STDOUT,
+				start_new_session = True
+			)
+		print( 'Draining the upload queue in the background, see {}'.format( log_filename ) )
+		return None
+	from worklog.upload import drain_outbox
+	drain_outbox( config )
+
+
+def on_daemon( args, config ):
+	from worklog.daemon import Daemon
+	Daemon( config ).serve()
 
 
 def handle_dynamic_alias_commands( args, aliases ):
@@ -183,10 +327,11 @@ def _add_start_command( sub_parser, common_parser ):
 
 
 def _add_resume_command( sub_parser, common_parser ):
-	blurb = 'like start, but reuse the description from a previous task in this worklog by seleting it from a list'
+	blurb = 'like start, but reuse the description from a previous task by seleting it from a list of the most recent ones'
 	resume_parser = sub_parser.add_parser( 'resume', help = blurb, description = blurb, parents = [ common_parser ] )
 	_at( resume_parser )
 	_ago( resume_parser )
+	resume_parser.add_argument( '--search', metavar = 'TEXT', help = 'only list the descriptions (or tickets) containing TEXT, from any day' )
 
 
 def _add_stop_command( sub_parser, common_parser ):
@@ -199,11 +344,62 @@ def _add_stop_command( sub_parser, common_parser ):
 def _add_report_command( sub_parser, common_parser ):
 	blurb = 'report the current state of the worklog'
 	report_parser = sub_parser.add_parser( 'report', help = blurb, description = blurb, parents = [ common_parser ] )
+	report_parser.add_argument( '--from', dest = 'from_day', metavar = 'DATE', help = 'report on every day from DATE, through --to or today' )
+	report_parser.add_argument( '--to', dest = 'to_day', metavar = 'DATE', help = 'report on every day through DATE' )
+	report_parser.add_argument( '--summary', default = False, action = 'store_true', help = 'only show the totals, not every entry' )
+	report_parser.add_argument( '--cache-stats', default = False, action = 'store_true', help = 'show rollup cache hits and misses for a --summary of a range' )
+
+
+def _add_status_command( sub_parser, common_parser ):
+	blurb = "show the current task and today's total in one line, for status bars"
+	status_parser = sub_parser.add_parser( 'status', help = blurb, description = blurb )
+	status_parser.add_argument(
+		'--format',
+		metavar = 'FORMAT',
+		help = 'format the line with any of {ticket}, {description}, {start}, {elapsed} and {total}'
+	)
 
 
 def _add_upload_command( sub_parser, common_parser ):
 	blurb = 'uploads worklog time to jira'
-	sub_parser.add_parser( 'upload', help = blurb, description = blurb, parents = [ common_parser ] )
+	upload_parser = sub_parser.add_parser( 'upload', help = blurb, description = blurb, parents = [ common_parser ] )
+	upload_parser.add_argument( '--coalesce', default = False, action = 'store_true', help = 'post one worklog per ticket for the day instead of one per task' )
+	upload_parser.add_argument( '--drain', default = False, action = 'store_true', help = 'post everything left queued by earlier uploads, in the background' )
+	upload_parser.add_argument( '--foreground', default = False, action = 'store_true', help = 'with --drain, wait for the queue to drain' )
+	upload_parser.add_argument( '--reconcile', default = False, action = 'store_true', help = "compare with the worklogs already in jira and only post what's missing" )
+	upload_parser.add_argument( '--dry-run', default = False, action = 'store_true', help = 'with --reconcile, only show what would be posted' )
+	upload_parser.add_argument( '--from', dest = 'from_day', metavar = 'DATE', help = 'upload every day from DATE, through --to or today, in one run' )
+	upload_parser.add_argument( '--to', dest = 'to_day', metavar = 'DATE', help = 'upload every day through DATE' )
+
+
+def _add_compact_command( sub_parser, common_parser ):
+	blurb = 'fold the journal of changes back into the worklog file (journal storage only)'
+	sub_parser.add_parser( 'compact', help = blurb, description = blurb, parents = [ common_parser ] )
+
+
+def _add_migrate_command( sub_parser, common_parser ):
+	blurb = 'import the JSON worklog files into the sqlite database'
+	sub_parser.add_parser( 'migrate', help = blurb, description = blurb )
+
+
+def _add_search_command( sub_parser, common_parser ):
+	blurb = 'find past tasks by words in their descriptions or tickets, newest first'
+	search_parser = sub_parser.add_parser( 'search', help = blurb, description = blurb )
+	search_parser.add_argument( 'words', metavar = 'WORD', nargs = '+', help = 'every word has to start a word of the description or ticket' )
+	search_parser.add_argument( '--limit', type = int, default = SEARCH_RESULTS, help = 'show at most this many entries, 0 for all (default: %(default)s)' )
+
+
+def _add_reindex_command( sub_parser, common_parser ):
+	blurb = 'rebuild the indexes of days, descriptions and search terms from every worklog'
+	sub_parser.add_parser( 'reindex', help = blurb, description = blurb )
+
+
+def _add_backfill_tickets_command( sub_parser, common_parser ):
+	blurb = "fill in the tickets of past tasks that don't have one from their descriptions"
+	backfill_parser = sub_parser.add_parser( 'backfill-tickets', help = blurb, description = blurb )
+	backfill_parser.add_argument( '--from', dest = 'from_day', metavar = 'DATE', help = 'only days from DATE, through --to or today' )
+	backfill_parser.add_argument( '--to', dest = 'to_day', metavar = 'DATE', help = 'only days through DATE' )
+	backfill_parser.add_argument( '--dry-run', default = False, action = 'store_true', help = 'only count what would be filled in' )
 
 
 def _add_alias_command( sub_parser, common_parser, command_aliases ):
@@ -224,9 +420,12 @@ def _add_alias_command( sub_parser, common_parser, command_aliases ):
 	alias_parser.add_argument( '--list', default = False, action = 'store_true' )
 
 
-def main( config ):
-	aliases = alias.Aliases( config )
-	command_aliases = tuple( aliases )
+def _add_daemon_command( sub_parser, common_parser ):
+	blurb = 'keep serving start, resume, stop and report from memory over a unix socket until interrupted'
+	sub_parser.add_parser( 'daemon', help = blurb, description = blurb )
+
+
+def build_parser( command_aliases ):
 	parser = argparse.ArgumentParser(
 		prog = 'worklog',
 		description = "Manage and report time allocation",
@@ -241,35 +440,59 @@ def main( config ):
 			_add_resume_command,
 			_add_stop_command,
 			_add_report_command,
-			_add_upload_command
+			_add_status_command,
+			_add_upload_command,
+			_add_compact_command,
+			_add_migrate_command,
+			_add_search_command,
+			_add_reindex_command,
+			_add_backfill_tickets_command,
+			_add_daemon_command
 			):
 		add_parser( sub_parser, common_parser )
 	_add_alias_command( sub_parser, common_parser, command_aliases )
+	return parser
 
-	args = parser.parse_args()
+
+def main( config, argv = None, parser = None ):
+	aliases = alias.Aliases( config )
+	if parser is None:
+		parser = build_parser( tuple( alias.index( config ).commands() ) )
+	args = parser.parse_args( argv )
+	if args.command == 'upload' and args.dry_run and not args.reconcile:
+		# every other kind of upload would post for real
+		parser.error( 'upload --dry-run only works with --reconcile' )
+	dispatch( args, parser, config, aliases )
+
+
+def dispatch( args, parser, config, aliases ):
 	color.ENABLED = config.features.colorize
 
 	if args.command == 'alias':
 		handle_dynamic_alias_commands( args, aliases )
 		raise Abort()
-	elif args.command in command_aliases:
+	elif args.command in aliases:
 		args = translate_aliases( args, parser, aliases )
 	try:
-		handler = globals()['on_{}'.format( args.command )]
+		handler = globals()['on_{}'.format( str( args.command ).replace( '-', '_' ) )]
 	except KeyError:
 		parser.print_help()
 	else:
-		if isinstance( handler, Callable ):
+		if callable( handler ):
 			handler( args, config )
 		else:
 			parser.error( "unrecognized command: '{}'".format( args.command ) )
 
 
-
-if __name__ == "__main__":
+def run( argv = None ):
 	try:
 		config_path = os.path.expanduser( CONFIG_PATH )
 		with ConfigFile( config_path ) as config:
-			main( config )
+			main( config, argv )
 	except Abort:
 		pass
+
+
+
+if __name__ == "__main__":
+	run()
@@ -1,4 +1,61 @@
 
+# the config snapshot and the AliasIndex built from it, rebuilt whenever the config changes
+_index = ( None, None )
+
+
+
+class AliasIndex:
+	""" Alias names stored word by word in a trie, to find the longest alias a description starts with. """
+
+	def __init__( self, aliases ):
+		self.aliases = dict( aliases )
+		self.trie = {}
+		# the most words in any one alias, no need to look further into a description than that
+		self.depth = 0
+		for name in self.aliases:
+			node = self.trie
+			words = name.split()
+			for word in words:
+				node = node.setdefault( word, {} )
+			node[None] = name
+			self.depth = max( self.depth, len( words ) )
+
+	def get( self, name, default = None ):
+		return self.aliases.get( name, default )
+
+	def __contains__( self, name ):
+		return name in self.aliases
+
+	def __iter__( self ):
+		return iter( self.aliases )
+
+	def commands( self ):
+		""" The aliases that can be used as a command, the ones without spaces. """
+		return [ name for name in self.aliases if len( name.split() ) == 1 ]
+
+	def match( self, description ):
+		""" The name of the longest alias made of the first whole words of `description`, or None. """
+		node = self.trie
+		name = None
+		for word in description.split( None, self.depth )[:self.depth]:
+			node = node.get( word )
+			if node is None:
+				break
+			name = node.get( None, name )
+		return name
+
+
+
+def index( config ):
+	""" The AliasIndex of the aliases in `config`, shared until the config changes. """
+	global _index
+	snapshot = config.snapshot()
+	if _index[0] is not snapshot:
+		_index = ( snapshot, AliasIndex( snapshot.get( 'aliases' ) or {} ) )
+	return _index[1]
+
+
+
 class Aliases:
 
 	def __init__( self, config ):
@@ -19,8 +76,9 @@ class Aliases:
 		return value
 
 	def __getitem__( self, alias ):
-		if alias in dict( self.config.aliases ):
-			return ' '.join( ( self.config.aliases[alias], alias ) )
+		value = index( self.config ).get( alias )
+		if value is not None:
+			return ' '.join( ( value, alias ) )
 
 	def __delitem__( self, alias ):
 		_aliases = self.config.aliases
@@ -33,13 +91,13 @@ class Aliases:
 		self.config['aliases'] = _aliases
 
 	def __contains__( self, alias ):
-		return alias in self.config.aliases
+		return alias in index( self.config )
 
 	def __iter__( self ):
-		return iter( dict( self.config.aliases ) )
+		return iter( index( self.config ) )
 
 	def __str__( self ):
-		aliases = list( self.config.aliases.items() )
+		aliases = list( index( self.config ).aliases.items() )
 		aliases.sort( key = lambda x: x[0].lower() )
 		width = max( len( x ) for x, y in aliases )
 		formatted = [ (x + ( ' ' * ( width - len( x ) ) ), y) for x, y in aliases ]
@@ -47,7 +105,10 @@ class Aliases:
 
 
 if __name__ == '__main__':
+	# worklog_completion.sh only gets here when its cached list is missing or older than the config, refresh it
+	from worklog.completion import write_aliases
 	from worklog.config import ConfigFile
 
 	with ConfigFile() as config:
-		print( ' '.join( tuple( Aliases( config ) ) ) )
+		write_aliases( config )
+		print( ' '.join( index( config ).commands() ) )
@@ -0,0 +1,78 @@
+
+import json
+import os
+import socket
+import sys
+
+from worklog import WORKLOG_DIR
+
+
+SOCKET_PATH = os.environ.get( 'WORKLOG_SOCKET' ) or os.path.join( WORKLOG_DIR, 'daemon.sock' )
+
+
+
+def connect():
+	""" A socket connected to a running `worklog daemon`, or None if there isn't one. """
+	client = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+	try:
+		client.connect( SOCKET_PATH )
+	except OSError:
+		client.close()
+		return None
+	return client
+
+
+
+def send( stream, message ):
+	stream.write( json.dumps( message ) + '\n' )
+	stream.flush()
+
+
+
+def remote( client, argv ):
+	""" Have the daemon run `argv`, relaying its output and prompts. The exit status, or None if it must be run here. """
+	with client, client.makefile( 'rw', encoding = 'utf-8' ) as stream:
+		send( stream, { 'argv': argv } )
+		for line in stream:
+			message = json.loads( line )
+			if 'out' in message:
+				sys.stdout.write( message['out'] )
+				sys.stdout.flush()
+			elif 'err' in message:
+				sys.stderr.write( message['err'] )
+			elif 'read' in message:
+				send( stream, { 'line': sys.stdin.readline() } )
+			elif 'local' in message:
+				return None
+			elif 'exit' in message:
+				return message['exit']
+	# the daemon went away mid command
+	return 1
+
+
+
+def run( argv = None ):
+	argv = sys.argv[1:] if argv is None else argv
+	if argv[:1] == [ 'status' ] and argv[1:2] in ( [], [ '--format' ] ) and len( argv ) in ( 1, 3 ):
+		# status bars poll this every few seconds, answer it from the status file without the config or argparse
+		from worklog.status import show
+		print( show( *argv[2:] ) )
+		return 0
+	client = connect()
+	status = None
+	if client is not None:
+		try:
+			status = remote( client, argv )
+		except KeyboardInterrupt:
+			status = 130
+	if status is None:
+		# no daemon, or a command it doesn't serve, pay for the full import and do it here
+		from worklog.__main__ import run as run_here
+		run_here( argv )
+		status = 0
+	return status
+
+
+
+if __name__ == '__main__':
+	sys.exit( run() )
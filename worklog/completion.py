@@ -0,0 +1,40 @@
+
+import os
+
+from worklog import WORKLOG_DIR
+from worklog import write_atomically
+from worklog import alias
+
+
+COMPLETION_DIR = os.path.join( WORKLOG_DIR, 'completion' )
+ALIASES_PATH = os.path.join( COMPLETION_DIR, 'aliases' )
+DESCRIPTIONS_PATH = os.path.join( COMPLETION_DIR, 'descriptions' )
+RECENT_DESCRIPTIONS = 50
+
+
+
+def _write_lines( filename, lines ):
+	write_atomically( filename, ''.join( line + '\n' for line in lines ) )
+
+
+
+def write_aliases( config ):
+	""" Save the aliases that can be used as commands, one per line, for worklog_completion.sh to read. """
+	_write_lines( ALIASES_PATH, alias.index( config ).commands() )
+
+
+
+def write_descriptions( worklog ):
+	""" Put `worklog`'s descriptions, latest first, ahead of the ones saved before, one per line. """
+	from worklog.state import GoHome
+	descriptions = [ ' '.join( task.description.split() ) for task in reversed( worklog.store ) if not isinstance( task, GoHome ) ]
+	try:
+		with open( DESCRIPTIONS_PATH, 'r' ) as file_handle:
+			descriptions.extend( file_handle.read().splitlines() )
+	except FileNotFoundError:
+		pass
+	recent = []
+	for description in descriptions:
+		if description and description not in recent:
+			recent.append( description )
+	_write_lines( DESCRIPTIONS_PATH, recent[:RECENT_DESCRIPTIONS] )
@@ -1,23 +1,48 @@
 
 import json
+import os
 
 from worklog import CONFIG_PATH
+from worklog import write_atomically
+from worklog import completion
+
+
+# filename -> ( ( mtime, size ), values ) of the config files this process has already parsed
+_parsed = {}
 
 
 class Config:
 
-	__passthrough = ( 'get', 'update' )
+	__passthrough = ( 'get', )
 
-	def __init__( self, values, defaults, name = None ):
+	def __init__( self, values, defaults, name = None, root = None ):
 		self._values = values
 		self._defaults = defaults or {}
 		self.name = name
+		self._root = root
+		self._snapshot = None
+
+	def _changed( self ):
+		self._snapshot = None
+		if self._root is not None:
+			self._root._changed()
+
+	def snapshot( self ):
+		""" A read only Section of the current values, built once and reused until something changes. """
+		if self._snapshot is None:
+			self._snapshot = Section( self._values or {}, self._defaults )
+		return self._snapshot
 
 	def __setitem__( self, item, value ):
 		# unpack Config objects so json can handle them
 		if isinstance( value , Config ):
 			value = dict( value )
 		self._values[item] = value
+		self._changed()
+
+	def update( self, *args, **kwargs ):
+		self._values.update( *args, **kwargs )
+		self._changed()
 
 	def __getitem__( self, item ):
 		return self._values[item]
@@ -33,7 +58,7 @@ class Config:
 				return self._values[self._values.index( attr )]
 			if isinstance( self._values, dict ):
 				if isinstance( self._values[attr], dict ):
-					return Config( self._values[attr], self._defaults.get( attr ) )
+					return Config( self._values[attr], self._defaults.get( attr ), root = self._root or self )
 			return self._values[attr]
 		elif self._defaults and attr in self._defaults:
 			return self._defaults[attr]
@@ -42,30 +67,110 @@ class Config:
 		raise AttributeError( 'Configuration section "{}" not found'.format( attr ) )
 
 
+class Section:
+	""" Config values with every nested section resolved against its defaults up front.
+
+	Looking things up is a plain dict lookup, no wrappers are allocated, which matters on paths run once per task.
+	Sections can't be changed, make changes through the Config they came from.
+
+	"""
+
+	__slots__ = ( '_values', '_sections' )
+
+	def __init__( self, values, defaults = None ):
+		defaults = defaults or {}
+		resolved = dict( defaults )
+		resolved.update( values )
+		sections = {
+			key: Section( value, defaults.get( key ) )
+			for key, value in resolved.items()
+			if isinstance( value, dict )
+		}
+		object.__setattr__( self, '_values', resolved )
+		object.__setattr__( self, '_sections', sections )
+
+	def __getattr__( self, attr ):
+		try:
+			return self._sections[attr]
+		except KeyError:
+			pass
+		try:
+			return self._values[attr]
+		except KeyError:
+			raise AttributeError( 'Configuration section "{}" not found'.format( attr ) ) from None
+
+	def __setattr__( self, attr, value ):
+		raise AttributeError( 'Config snapshots are read only' )
+
+	def __getitem__( self, item ):
+		return self._values[item]
+
+	def __iter__( self ):
+		return iter( tuple( self._values.items() ) )
+
+	def get( self, key, default = None ):
+		return self._values.get( key, default )
+
+	def snapshot( self ):
+		return self
+
+
 class ConfigFile( Config ):
+	""" The config file, only written back (atomically) when something was changed. """
 
 	def __init__( self, filename = None, defaults = None ):
 		super().__init__( values = None, defaults = defaults, name = 'config' )
 		self._filename = filename or CONFIG_PATH
+		self.dirty = False
+
+	def _changed( self ):
+		super()._changed()
+		self.dirty = True
 
 	def __enter__( self ):
 		self.__read()
 		return self
 
 	def __exit__( self, *err ):
+		if self.dirty:
+			self.__write()
+
+	def load( self ):
+		self.__read()
+		return self
+
+	def save( self ):
 		self.__write()
 
+	def _signature( self ):
+		stat = os.stat( self._filename )
+		return ( stat.st_mtime_ns, stat.st_size )
+
 	def __read( self ):
 		try:
-			with open( self._filename, 'r' ) as config_file:
-				self._values = json.load( config_file )
+			signature = self._signature()
+			parsed = _parsed.get( self._filename )
+			if parsed is not None and parsed[0] == signature:
+				if self._values is not parsed[1]:
+					self._values = parsed[1]
+					self._snapshot = None
+			else:
+				with open( self._filename, 'r' ) as config_file:
+					self._values = json.load( config_file )
+				self._snapshot = None
+				_parsed[self._filename] = ( signature, self._values )
 		except FileNotFoundError as e:
 			print( e )
+		self.dirty = False
 
 	def __write( self ):
 		if self._values:
 			try:
-				with open( self._filename, 'w' ) as config_file:
-					json.dump( self._values, config_file, sort_keys = True, indent = 4 )
+				write_atomically( self._filename, json.dumps( self._values, sort_keys = True, indent = 4 ) )
 			except FileNotFoundError as e:
 				print( e )
+			else:
+				_parsed[self._filename] = ( self._signature(), self._values )
+				# the only changes made through the config are to aliases, keep the shell completion in step
+				completion.write_aliases( self )
+		self.dirty = False
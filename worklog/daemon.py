@@ -0,0 +1,133 @@
+
+import json
+import os
+import signal
+import socketserver
+import sys
+import traceback
+
+from worklog import alias
+from worklog.__main__ import build_parser, dispatch
+from worklog.client import SOCKET_PATH, connect, send
+from worklog.state import Abort, Worklog
+
+
+SERVED_COMMANDS = ( None, 'start', 'resume', 'stop', 'report', 'search', 'alias' )
+
+
+
+class Channel:
+	""" Stands in for stdin, stdout or stderr while a command runs, relaying to and from the client. """
+
+	def __init__( self, stream, kind ):
+		self.stream = stream
+		self.kind = kind
+		self.hung_up = False
+
+	def write( self, text ):
+		if text and not self.hung_up:
+			try:
+				send( self.stream, { self.kind: text } )
+			except OSError:
+				# the client went away, let the command finish anyway so the worklog is still saved
+				self.hung_up = True
+		return len( text )
+
+	def flush( self ):
+		pass
+
+	def readline( self ):
+		send( self.stream, { 'read': True } )
+		line = self.stream.readline()
+		if not line:
+			# the client hung up, look like the end of input
+			return ''
+		return json.loads( line )['line']
+
+	def isatty( self ):
+		return False
+
+
+
+class _Handler( socketserver.StreamRequestHandler ):
+
+	def handle( self ):
+		with self.connection.makefile( 'rw', encoding = 'utf-8' ) as stream:
+			line = stream.readline()
+			if line:
+				self.server.daemon.handle( json.loads( line )['argv'], stream )
+
+
+
+class Daemon:
+	""" Serves start, resume, stop and report (and alias shortcuts) over a unix socket from one long running process.
+
+	The config, the argument parser and recently used days stay in memory between commands. Each is checked against
+	the file it came from first, so commands run by hand in the meantime are picked up. Commands are run one at a time,
+	anything else is handed back to the client to run itself.
+
+	"""
+
+	def __init__( self, config, socket_path = None ):
+		self.config = config
+		self.socket_path = socket_path or SOCKET_PATH
+		self.parsers = {}
+		Worklog.memo = {}
+
+	def _parser( self, command_aliases ):
+		if command_aliases not in self.parsers:
+			self.parsers = { command_aliases: build_parser( command_aliases ) }
+		return self.parsers[command_aliases]
+
+	def serve( self ):
+		if connect() is not None:
+			print( 'A worklog daemon is already listening on {}'.format( self.socket_path ) )
+			raise Abort()
+		if os.path.exists( self.socket_path ):
+			# left behind by a daemon that didn't get to clean up
+			os.remove( self.socket_path )
+		os.makedirs( os.path.dirname( self.socket_path ), exist_ok = True )
+		umask = os.umask( 0o077 )
+		try:
+			server = socketserver.UnixStreamServer( self.socket_path, _Handler )
+		finally:
+			os.umask( umask )
+		server.daemon = self
+		# stopping the daemon politely should clean up the socket too
+		signal.signal( signal.SIGTERM, lambda *args: sys.exit( 0 ) )
+		print( 'Listening on {}'.format( self.socket_path ), flush = True )
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			server.server_close()
+			os.remove( self.socket_path )
+
+	def handle( self, argv, stream ):
+		# only parsed again if the file changed since
+		self.config.load()
+		streams = ( sys.stdin, sys.stdout, sys.stderr )
+		sys.stdin, sys.stdout, sys.stderr = Channel( stream, 'in' ), Channel( stream, 'out' ), Channel( stream, 'err' )
+		status = 0
+		try:
+			aliases = alias.Aliases( self.config )
+			command_aliases = tuple( alias.index( self.config ).commands() )
+			parser = self._parser( command_aliases )
+			args = parser.parse_args( argv )
+			if args.command not in SERVED_COMMANDS and args.command not in command_aliases:
+				send( stream, { 'local': True } )
+				return None
+			dispatch( args, parser, self.config, aliases )
+		except Abort:
+			pass
+		except SystemExit as e:
+			status = e.code if isinstance( e.code, int ) else 1
+		except Exception:
+			traceback.print_exc()
+			status = 1
+		finally:
+			sys.stdin, sys.stdout, sys.stderr = streams
+		if self.config.dirty:
+			self.config.save()
+		send( stream, { 'exit': status } )
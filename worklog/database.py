@@ -0,0 +1,158 @@
+
+from datetime import datetime
+import os
+import sqlite3
+
+
+DEFAULT_DATABASE = '~/.worklog/worklog.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+	id INTEGER PRIMARY KEY,
+	day TEXT NOT NULL,
+	position INTEGER NOT NULL,
+	klass TEXT NOT NULL,
+	start TEXT,
+	ticket TEXT,
+	description TEXT,
+	logged INTEGER
+);
+CREATE INDEX IF NOT EXISTS tasks_day ON tasks ( day, position );
+CREATE INDEX IF NOT EXISTS tasks_start ON tasks ( start );
+CREATE INDEX IF NOT EXISTS tasks_ticket ON tasks ( ticket );
+CREATE INDEX IF NOT EXISTS tasks_description ON tasks ( description );
+'''
+
+_connections = {}
+
+
+
+def database_filename( config ):
+	filename = config.state.get( 'database' ) or DEFAULT_DATABASE
+	return os.path.expandvars( os.path.expanduser( filename ) )
+
+
+
+def connect( config ):
+	""" Return the (per process, shared) connection to the worklog database, creating it as needed. """
+	filename = database_filename( config )
+	if filename not in _connections:
+		os.makedirs( os.path.dirname( filename ), exist_ok = True )
+		connection = sqlite3.connect( filename )
+		# WAL lets reports read while another invocation is writing
+		connection.execute( 'PRAGMA journal_mode=WAL' )
+		connection.executescript( SCHEMA )
+		_connections[filename] = connection
+	return _connections[filename]
+
+
+
+def _day_key( day ):
+	return day.strftime( '%Y-%m-%d' )
+
+
+
+def _to_row( day, position, task ):
+	state = task.__getstate__()
+	return (
+		_day_key( day ),
+		position,
+		state['__klass__'],
+		state['start'],
+		state.get( 'ticket' ) or None,
+		state.get( 'description' ),
+		state.get( 'logged' )
+	)
+
+
+
+def _from_row( row ):
+	from worklog.state import _get_cls
+	klass, start, ticket, description, logged = row
+	state = { '__klass__': klass, 'start': start, 'ticket': ticket or False, 'description': description, 'logged': logged }
+	if logged is not None:
+		state['logged'] = bool( logged )
+	task = _get_cls( klass )()
+	task.__setstate__( state )
+	return task
+
+
+
+def has_day( config, day ):
+	cursor = connect( config ).execute( 'SELECT 1 FROM tasks WHERE day = ? LIMIT 1', ( _day_key( day ), ) )
+	return cursor.fetchone() is not None
+
+
+
+def days( config, start = None, end = None ):
+	""" The days between `start` and `end` inclusive that have tasks, every day with tasks by default. """
+	if start is None:
+		cursor = connect( config ).execute( 'SELECT DISTINCT day FROM tasks ORDER BY day' )
+	else:
+		cursor = connect( config ).execute(
+				'SELECT DISTINCT day FROM tasks WHERE day BETWEEN ? AND ? ORDER BY day',
+				( _day_key( start ), _day_key( end ) )
+				)
+	return [ datetime.strptime( day, '%Y-%m-%d' ).date() for day, in cursor ]
+
+
+
+def load( worklog ):
+	cursor = connect( worklog.config ).execute(
+			'SELECT klass, start, ticket, description, logged FROM tasks WHERE day = ? ORDER BY position',
+			( _day_key( worklog.when ), )
+			)
+	worklog.store.extend( _from_row( row ) for row in cursor )
+
+
+
+def dump( worklog ):
+	rows = [ _to_row( worklog.when, position, task ) for position, task in enumerate( worklog.store ) if task ]
+	connection = connect( worklog.config )
+	with connection:
+		connection.execute( 'DELETE FROM tasks WHERE day = ?', ( _day_key( worklog.when ), ) )
+		connection.executemany(
+				'INSERT INTO tasks ( day, position, klass, start, ticket, description, logged ) VALUES ( ?, ?, ?, ?, ?, ?, ? )',
+				rows
+				)
+
+
+
+def query( config, ticket = None, description = None, start = None, end = None ):
+	""" Tasks matching all of the given criteria across every day, in start order.
+
+	`description` matches as a substring, `start` and `end` are datetimes bounding the task start.
+
+	"""
+	clauses = [ "klass = 'Task'" ]
+	params = []
+	if ticket:
+		clauses.append( 'ticket = ?' )
+		params.append( ticket )
+	if description:
+		clauses.append( "description LIKE ? ESCAPE '\\'" )
+		params.append( '%{}%'.format( description.replace( '\\', '\\\\' ).replace( '%', '\\%' ).replace( '_', '\\_' ) ) )
+	if start:
+		clauses.append( 'start >= ?' )
+		params.append( start.isoformat() )
+	if end:
+		clauses.append( 'start <= ?' )
+		params.append( end.isoformat() )
+	cursor = connect( config ).execute(
+			'SELECT klass, start, ticket, description, logged FROM tasks WHERE {} ORDER BY start'.format( ' AND '.join( clauses ) ),
+			params
+			)
+	return [ _from_row( row ) for row in cursor ]
+
+
+
+def import_day_files( config ):
+	""" Copy every JSON (and journal) day file into the database, returns the number of days imported. """
+	from worklog.state import Worklog, day_files
+	imported = 0
+	for day, _ in day_files( config ):
+		json_worklog = Worklog( when = day, config = config, storage = 'journal' )
+		json_worklog.load()
+		dump( json_worklog )
+		imported += 1
+	return imported
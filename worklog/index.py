@@ -0,0 +1,74 @@
+
+import os
+
+
+
+class SqliteIndex:
+	""" Something worked out from every worklog in the history, kept in a sqlite database a day at a time.
+
+	Subclasses give the SCHEMA, the `state` config key (and default) for the database's filename and update( worklog ),
+	which replaces just that day's rows. Built from every worklog the first time it is needed.
+
+	"""
+
+	SCHEMA = ''
+	CONFIG_KEY = None
+	DEFAULT_FILENAME = None
+
+	def __init__( self, config ):
+		self.config = config
+		filename = config.state.get( self.CONFIG_KEY ) or self.DEFAULT_FILENAME
+		self.filename = os.path.expandvars( os.path.expanduser( filename ) )
+		self.connection = None
+
+	def __enter__( self ):
+		self.connect()
+		return self
+
+	def __exit__( self, exc_type, exc_value, exc_traceback ):
+		self.close()
+
+	@property
+	def exists( self ):
+		return os.path.exists( self.filename )
+
+	def connect( self, filename = None ):
+		if self.connection is None:
+			# only paid for by commands that actually use an index or keep an existing one up to date
+			import sqlite3
+			filename = filename or self.filename
+			os.makedirs( os.path.dirname( filename ), exist_ok = True )
+			self.connection = sqlite3.connect( filename )
+			self.connection.executescript( self.SCHEMA )
+		return self.connection
+
+	def close( self ):
+		if self.connection is not None:
+			self.connection.close()
+			self.connection = None
+
+	def update( self, worklog ):
+		raise NotImplementedError()
+
+	def reindex( self ):
+		""" Rebuild from every worklog, returns the number of days indexed.
+
+		The new index is built next to the old one and swapped in when it is complete.
+
+		"""
+		from worklog.state import Worklog, history
+		self.close()
+		temp_filename = self.filename + '.tmp'
+		if os.path.exists( temp_filename ):
+			os.remove( temp_filename )
+		# nothing reads the new index until it is swapped in, no need to wait on the disk for every day
+		self.connect( temp_filename ).execute( 'PRAGMA synchronous = OFF' )
+		days = 0
+		for day in history( self.config ):
+			worklog = Worklog( when = day, config = self.config )
+			worklog.load()
+			self.update( worklog )
+			days += 1
+		self.close()
+		os.replace( temp_filename, self.filename )
+		return days
@@ -0,0 +1,93 @@
+
+import json
+import os
+import threading
+import time
+
+from worklog import WORKLOG_DIR
+from worklog import write_atomically
+
+
+DEFAULT_ISSUE_CACHE = os.path.join( WORKLOG_DIR, 'issue-cache.json' )
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_SIZE = 1000
+
+
+
+class IssueCache:
+	""" Jira issue ids, keys and summaries by ticket, so repeat uploads and reports don't have to ask the server.
+
+	Entries expire after `jira.issue_cache_ttl` seconds and the least recently used are dropped once there are more
+	than `jira.issue_cache_size` of them. Safe to share between upload worker threads.
+
+	"""
+
+	def __init__( self, config ):
+		self.config = config
+		filename = config.jira.get( 'issue_cache' ) or DEFAULT_ISSUE_CACHE
+		self.filename = os.path.expandvars( os.path.expanduser( filename ) )
+		self.ttl = config.jira.get( 'issue_cache_ttl', DEFAULT_TTL )
+		self.size = config.jira.get( 'issue_cache_size', DEFAULT_SIZE )
+		self.entries = {}
+		self.dirty = False
+		self._lock = threading.Lock()
+
+	def __enter__( self ):
+		self.load()
+		return self
+
+	def __exit__( self, exc_type, exc_value, exc_traceback ):
+		# whatever was resolved before a failure is still worth keeping
+		if self.dirty:
+			self.dump()
+
+	def load( self ):
+		if os.path.exists( self.filename ):
+			with open( self.filename, 'r' ) as file_handle:
+				self.entries = json.load( file_handle )
+		return self
+
+	def dump( self ):
+		with self._lock:
+			if len( self.entries ) > self.size:
+				by_use = sorted( self.entries, key = lambda ticket: self.entries[ticket]['used'] )
+				for ticket in by_use[:len( self.entries ) - self.size]:
+					del self.entries[ticket]
+			write_atomically( self.filename, json.dumps( self.entries ) )
+			self.dirty = False
+
+	def get( self, ticket, touch = True ):
+		""" The cached issue for `ticket`, or None if it isn't cached or has expired. """
+		with self._lock:
+			entry = self.entries.get( ticket )
+			if entry is None:
+				return None
+			now = time.time()
+			if now - entry['fetched'] > self.ttl:
+				return None
+			if touch:
+				entry['used'] = now
+				self.dirty = True
+			return entry
+
+	def put( self, ticket, issue ):
+		""" Cache a jira.resources.Issue for `ticket`. """
+		now = time.time()
+		entry = { 'id': issue.id, 'key': issue.key, 'summary': issue.fields.summary, 'fetched': now, 'used': now }
+		with self._lock:
+			self.entries[ticket] = entry
+			self.dirty = True
+		return entry
+
+	def resolve( self, jira, ticket ):
+		""" The issue for `ticket` from the cache, or from the server (and then cached). """
+		entry = self.get( ticket )
+		if entry is None:
+			entry = self.put( ticket, jira.issue( ticket, fields = 'summary' ) )
+		return entry
+
+	def summary( self, ticket ):
+		entry = self.get( ticket, touch = False )
+		if entry is None:
+			return None
+		return entry['summary']
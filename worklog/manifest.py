@@ -0,0 +1,104 @@
+
+from datetime import datetime
+import json
+import os
+
+from worklog import WORKLOG_DIR
+from worklog import write_atomically
+from worklog.rollup import day_rollup
+
+
+DEFAULT_MANIFEST = os.path.join( WORKLOG_DIR, 'manifest.json' )
+
+
+
+def summarize( worklog ):
+	""" Count, first/last start, closed time in total and per ticket, and unlogged ticketed segments for a worklog. """
+	from worklog.state import GoHome, DummyRightNow
+	rollup = day_rollup( worklog )
+	unlogged = 0
+	for task, next_task in worklog.pairwise():
+		if isinstance( task, GoHome ) or not task.ticket or task.logged:
+			continue
+		# upload posts the open segment too, with however long it has run by then
+		if isinstance( next_task, DummyRightNow ) or next_task.start > task.start:
+			unlogged += 1
+	return {
+		'count': len( worklog ),
+		'first': worklog[0].start.isoformat(),
+		'last': worklog[-1].start.isoformat(),
+		'total': rollup['total'],
+		'tickets': rollup['tickets'],
+		'unlogged': unlogged
+	}
+
+
+
+class Manifest:
+	""" Which days have worklog entries, with a summary of each, stored in one small JSON file.
+
+	Built from every worklog the first time a range of days needs it, saving a day only keeps an existing one up to
+	date.
+
+	"""
+
+	def __init__( self, config ):
+		self.config = config
+		filename = config.state.get( 'manifest' ) or DEFAULT_MANIFEST
+		self.filename = os.path.expandvars( os.path.expanduser( filename ) )
+		self.days = {}
+		self.loaded = False
+		self.dirty = False
+
+	def __enter__( self ):
+		self.load()
+		return self
+
+	def __exit__( self, exc_type, exc_value, exc_traceback ):
+		if not exc_type and self.dirty:
+			self.dump()
+
+	@property
+	def exists( self ):
+		return os.path.exists( self.filename )
+
+	def load( self ):
+		if self.exists:
+			with open( self.filename, 'r' ) as file_handle:
+				self.days = json.load( file_handle )
+			self.loaded = True
+		return self
+
+	def dump( self ):
+		write_atomically( self.filename, json.dumps( self.days, sort_keys = True ) )
+		self.dirty = False
+
+	def update( self, worklog ):
+		key = worklog.when.strftime( '%Y-%m-%d' )
+		summary = summarize( worklog ) if len( worklog ) else None
+		if self.days.get( key ) == summary:
+			return None
+		if summary is None:
+			del self.days[key]
+		else:
+			self.days[key] = summary
+		self.dirty = True
+
+	def get( self, day ):
+		return self.days.get( day.strftime( '%Y-%m-%d' ) )
+
+	def days_between( self, start, end ):
+		""" The days between `start` and `end` inclusive that have entries, in order. """
+		start, end = start.strftime( '%Y-%m-%d' ), end.strftime( '%Y-%m-%d' )
+		return [ datetime.strptime( key, '%Y-%m-%d' ).date() for key in sorted( self.days ) if start <= key <= end ]
+
+	def reindex( self ):
+		""" Rebuild the manifest from every worklog on disk, returns the number of days indexed. """
+		from worklog.state import Worklog, history
+		self.days = {}
+		for day in history( self.config ):
+			worklog = Worklog( when = day, config = self.config )
+			worklog.load()
+			self.update( worklog )
+		self.dirty = True
+		return len( self.days )
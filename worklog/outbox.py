@@ -0,0 +1,152 @@
+
+from datetime import date, datetime, timedelta
+import fcntl
+import hashlib
+import json
+import os
+import threading
+
+from worklog import WORKLOG_DIR
+from worklog import write_atomically
+
+
+DEFAULT_OUTBOX = os.path.join( WORKLOG_DIR, 'outbox.jsonl' )
+DEFAULT_RETENTION = 30
+
+
+
+def task_key( ticket, start ):
+	return '{} {}'.format( ticket, start.isoformat() )
+
+
+
+def idempotency_key( ticket, started, seconds ):
+	return hashlib.sha1( '{} {} {:d}'.format( ticket, started, seconds ).encode() ).hexdigest()[:16]
+
+
+
+class Outbox:
+	""" A ledger of worklog posts, so an upload that dies partway never posts the same time twice.
+
+	Each post is recorded as pending before it is sent and checkpointed as done (or failed) as soon as the server
+	answers, one appended JSON line at a time. Done posts are kept for `jira.outbox_retention` days so tasks whose
+	`logged` flag never got saved are recognized on the next upload.
+
+	Reading (and compacting) the ledger and appending to it hold a lock file, an upload can run while a drain is still
+	going in the background.
+
+	"""
+
+	def __init__( self, config ):
+		self.config = config
+		filename = config.jira.get( 'outbox' ) or DEFAULT_OUTBOX
+		self.filename = os.path.expandvars( os.path.expanduser( filename ) )
+		self.retention = config.jira.get( 'outbox_retention', DEFAULT_RETENTION )
+		self.items = {}
+		self._tasks = {}
+		self._records = 0
+		self._lock = threading.Lock()
+
+	def __enter__( self ):
+		self.load()
+		return self
+
+	def __exit__( self, exc_type, exc_value, exc_traceback ):
+		pass
+
+	def load( self ):
+		if not os.path.exists( self.filename ):
+			return self
+		# compacting rewrites the ledger from what was read, nobody may append in between
+		with self._locked():
+			with open( self.filename, 'r' ) as file_handle:
+				for line in file_handle:
+					try:
+						record = json.loads( line )
+					except ValueError:
+						# torn final record from a crash, the post it describes is still pending
+						break
+					self._apply( record )
+					self._records += 1
+			if self._records > 2 * len( self.items ) + 100:
+				self.compact()
+		return self
+
+	def _locked( self ):
+		""" The ledger's lock file, held by this process until it is closed. """
+		lock_file = open( self.filename + '.lock', 'a' )
+		fcntl.flock( lock_file, fcntl.LOCK_EX )
+		return lock_file
+
+	def _apply( self, record ):
+		if record['op'] == 'enqueue':
+			item = record['item']
+			self.items[item['key']] = item
+			for start in item['tasks']:
+				self._tasks[task_key( item['ticket'], datetime.fromisoformat( start ) )] = item['key']
+		elif record['key'] in self.items:
+			item = self.items[record['key']]
+			item['status'] = record['op']
+			item['attempts'] = record.get( 'attempts', item.get( 'attempts', 0 ) )
+			item['error'] = record.get( 'error' )
+
+	def _append( self, record ):
+		with self._lock, self._locked():
+			self._apply( record )
+			with open( self.filename, 'a' ) as file_handle:
+				file_handle.write( json.dumps( record ) + '\n' )
+				file_handle.flush()
+				os.fsync( file_handle.fileno() )
+			self._records += 1
+
+	def compact( self ):
+		""" Rewrite the ledger with just the pending posts and the done posts still within the retention period.
+
+		Only called by load, with the lock held.
+
+		"""
+		oldest = ( date.today() - timedelta( days = self.retention ) ).isoformat()
+		keep = { key: item for key, item in self.items.items() if item['status'] != 'done' or item['day'] >= oldest }
+		write_atomically( self.filename, ''.join( json.dumps( { 'op': 'enqueue', 'item': item } ) + '\n' for item in keep.values() ) )
+		self.items = {}
+		self._tasks = {}
+		for item in keep.values():
+			self._apply( { 'op': 'enqueue', 'item': item } )
+		self._records = len( keep )
+
+	def status( self, task ):
+		""" 'done', 'pending' or 'failed' if the task is part of a recorded post, otherwise None. """
+		key = self._tasks.get( task_key( task.ticket, task.start ) )
+		if key is None:
+			return None
+		return self.items[key]['status']
+
+	def enqueue( self, day, tasks, duration ):
+		started = tasks[0].start.isoformat()
+		key = idempotency_key( tasks[0].ticket, started, duration.seconds )
+		if key not in self.items:
+			os.makedirs( os.path.dirname( self.filename ), exist_ok = True )
+			self._append( { 'op': 'enqueue', 'item': {
+				'key': key,
+				'day': day.isoformat(),
+				'ticket': tasks[0].ticket,
+				'started': started,
+				'seconds': duration.seconds,
+				'tasks': [ task.start.isoformat() for task in tasks ],
+				'status': 'pending',
+				'attempts': 0
+			} } )
+		return self.items[key]
+
+	def pending( self, day = None ):
+		""" Posts that haven't gone through yet, optionally only those for one day. """
+		return [
+			item for item in self.items.values()
+			if item['status'] != 'done' and ( day is None or item['day'] == day.isoformat() )
+		]
+
+	def done( self, item, attempts ):
+		self._append( { 'op': 'done', 'key': item['key'], 'attempts': attempts } )
+
+	def failed( self, item, attempts, error ):
+		self._append( { 'op': 'failed', 'key': item['key'], 'attempts': attempts, 'error': str( error ) } )
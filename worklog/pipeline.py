@@ -0,0 +1,180 @@
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import time
+
+from worklog.issues import IssueCache
+from worklog.manifest import Manifest
+from worklog.outbox import Outbox
+from worklog.time_utils import Duration
+from worklog.upload import (
+	DEFAULT_BACKOFF,
+	DEFAULT_CONCURRENCY,
+	DEFAULT_RETRIES,
+	_entries,
+	_mark_logged,
+	_retryable,
+	_started,
+	_unlogged_segments,
+	auth_jira
+)
+
+
+DEFAULT_RATE_LIMIT = 10
+
+
+
+class TokenBucket:
+	""" Allows `rate` requests per second on average, in bursts of up to `burst`. """
+
+	def __init__( self, rate, burst = None ):
+		self.rate = rate
+		self.burst = burst or rate
+		self.tokens = self.burst
+		self.refilled = time.monotonic()
+		self._lock = asyncio.Lock()
+
+	async def acquire( self ):
+		async with self._lock:
+			while True:
+				now = time.monotonic()
+				self.tokens = min( self.burst, self.tokens + ( now - self.refilled ) * self.rate )
+				self.refilled = now
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return None
+				await asyncio.sleep( ( 1 - self.tokens ) / self.rate )
+
+
+
+class Pipeline:
+	""" Uploads every day of a WorklogRange in one run.
+
+	Days are read and queued while earlier days are still being posted. Every request to the server waits on one
+	shared rate limiter, at most `jira.concurrency` posts are in flight, and progress is printed as each one finishes.
+	The blocking jira client calls run on a thread pool sized to match.
+
+	"""
+
+	def __init__( self, worklog_range, config, coalesce = False ):
+		self.worklog_range = worklog_range
+		self.config = config
+		self.coalesce = coalesce
+		self.concurrency = config.jira.get( 'concurrency' ) or DEFAULT_CONCURRENCY
+		self.retries = config.jira.get( 'retries', DEFAULT_RETRIES )
+		self.backoff = config.jira.get( 'backoff', DEFAULT_BACKOFF )
+		self.rate_limit = config.jira.get( 'rate_limit' ) or DEFAULT_RATE_LIMIT
+		self.worklogs = []
+		# ticket -> the request for its issue that is in flight, workers that miss the cache for it wait on that one
+		self.fetching = {}
+		self.queued = 0
+		self.posted = 0
+		self.failed = 0
+		self.reading = True
+
+	def run( self ):
+		self.jira = auth_jira( self.config )
+		with Outbox( self.config ) as self.outbox, IssueCache( self.config ) as self.issues:
+			asyncio.run( self._run() )
+			for worklog in self.worklogs:
+				_mark_logged( worklog, self.outbox )
+				worklog.dump()
+		if self.failed:
+			print( 'Done, {:d} posted, {:d} failed and will be retried on the next upload.'.format( self.posted, self.failed ) )
+		else:
+			print( 'Done, {:d} posted.'.format( self.posted ) )
+
+	async def _run( self ):
+		loop = asyncio.get_running_loop()
+		loop.set_default_executor( ThreadPoolExecutor( max_workers = self.concurrency ) )
+		self.limiter = TokenBucket( self.rate_limit, self.config.jira.get( 'burst' ) )
+		queue = asyncio.Queue( maxsize = self.concurrency * 2 )
+		workers = [ asyncio.create_task( self._worker( queue ) ) for _ in range( self.concurrency ) ]
+		await self._read( queue )
+		await queue.join()
+		for worker in workers:
+			worker.cancel()
+		await asyncio.gather( *workers, return_exceptions = True )
+
+	async def _read( self, queue ):
+		loop = asyncio.get_running_loop()
+		manifest = Manifest( self.config ).load()
+		for worklog in self.worklog_range.worklogs():
+			summary = manifest.get( worklog.when )
+			if summary is not None and not summary['unlogged']:
+				continue
+			await loop.run_in_executor( None, worklog.load )
+			self.worklogs.append( worklog )
+			segments = [ ( task, duration ) for task, duration in _unlogged_segments( worklog ) if self.outbox.status( task ) is None ]
+			for tasks, duration in _entries( segments, self.config, self.coalesce ):
+				self.outbox.enqueue( worklog.when, tasks, duration )
+			for item in self.outbox.pending( worklog.when ):
+				self.queued += 1
+				await queue.put( item )
+		self.reading = False
+
+	async def _worker( self, queue ):
+		while True:
+			item = await queue.get()
+			try:
+				await self._post( item )
+			finally:
+				queue.task_done()
+
+	async def _request( self, function, *args, **kwargs ):
+		await self.limiter.acquire()
+		return await asyncio.get_running_loop().run_in_executor( None, lambda: function( *args, **kwargs ) )
+
+	async def _issue( self, ticket ):
+		""" The issue for `ticket` from the cache, or from the server with one request however many workers ask. """
+		entry = self.issues.get( ticket )
+		if entry is not None:
+			return entry
+		if ticket not in self.fetching:
+			self.fetching[ticket] = asyncio.ensure_future( self._fetch_issue( ticket ) )
+		return await self.fetching[ticket]
+
+	async def _fetch_issue( self, ticket ):
+		try:
+			issue = await self._request( self.jira.issue, ticket, fields = 'summary' )
+			return self.issues.put( ticket, issue )
+		finally:
+			# cached (or failed, for the next attempt to try again)
+			del self.fetching[ticket]
+
+	async def _post( self, item ):
+		duration = Duration( timedelta( seconds = item['seconds'] ) )
+		attempts = item.get( 'attempts', 0 )
+		start = time.perf_counter()
+		for attempt in range( self.retries + 1 ):
+			attempts += 1
+			try:
+				ticket = await self._issue( item['ticket'] )
+				await self._request(
+					self.jira.add_worklog,
+					issue = ticket['key'],
+					timeSpent = str( duration ),
+					started = _started( datetime.fromisoformat( item['started'] ) )
+				)
+			except Exception as e:
+				if attempt == self.retries or not _retryable( e ):
+					self.outbox.failed( item, attempts, e )
+					self.failed += 1
+					self._progress( 'Failed to log {} to ticket {} on {}: {}'.format( duration, item['ticket'], item['day'], e ) )
+					return None
+				await asyncio.sleep( self.backoff * ( 2 ** attempt ) )
+			else:
+				self.outbox.done( item, attempts )
+				self.posted += 1
+				self._progress( 'Logged {} to ticket {} on {} ({:.0f}ms)'.format( duration, item['ticket'], item['day'], ( time.perf_counter() - start ) * 1000 ) )
+				return None
+
+	def _progress( self, message ):
+		total = '{:d}{}'.format( self.queued, '+' if self.reading else '' )
+		print( '[{:d}/{}] {}'.format( self.posted + self.failed, total, message ), flush = True )
+
+
+
+def upload_range( worklog_range, config, coalesce = False ):
+	Pipeline( worklog_range, config, coalesce = coalesce ).run()
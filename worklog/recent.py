@@ -0,0 +1,94 @@
+
+import os
+
+from worklog import WORKLOG_DIR
+from worklog.index import SqliteIndex
+
+
+DEFAULT_RECENT = os.path.join( WORKLOG_DIR, 'recent.sqlite' )
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS shares (
+	description TEXT NOT NULL,
+	day TEXT NOT NULL,
+	seconds INTEGER NOT NULL,
+	last TEXT NOT NULL,
+	ticket TEXT,
+	PRIMARY KEY ( description, day )
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS shares_day ON shares ( day );
+'''
+
+
+
+def day_descriptions( worklog ):
+	""" Each description used in `worklog` with its time in seconds, its latest start and the ticket it had then. """
+	from worklog.state import GoHome, DummyRightNow
+	descriptions = {}
+	for task, next_task in worklog.pairwise():
+		if isinstance( task, GoHome ) or not task.description:
+			continue
+		seconds = 0
+		if not isinstance( next_task, DummyRightNow ):
+			seconds = int( ( next_task.start - task.start ).total_seconds() )
+		entry = descriptions.setdefault( task.description, [ 0, None, None ] )
+		entry[0] += seconds
+		entry[1] = task.start.isoformat()
+		entry[2] = task.ticket or None
+	return descriptions
+
+
+
+class RecentDescriptions( SqliteIndex ):
+	""" Every description ever used, when it was last used, with which ticket and for how long in total.
+
+	Each day's share (time, latest start and ticket per description) is a row of its own in a sqlite database, so
+	saving a day only replaces that day's rows and the totals are summed up when asked for.
+
+	"""
+
+	SCHEMA = SCHEMA
+	CONFIG_KEY = 'recent'
+	DEFAULT_FILENAME = DEFAULT_RECENT
+
+	def update( self, worklog ):
+		key = worklog.when.strftime( '%Y-%m-%d' )
+		shares = sorted( ( description, ) + tuple( entry ) for description, entry in day_descriptions( worklog ).items() )
+		connection = self.connect()
+		stored = connection.execute(
+				'SELECT description, seconds, last, ticket FROM shares WHERE day = ? ORDER BY description',
+				( key, )
+				).fetchall()
+		if stored == shares:
+			return None
+		with connection:
+			connection.execute( 'DELETE FROM shares WHERE day = ?', ( key, ) )
+			connection.executemany(
+					'INSERT INTO shares ( description, day, seconds, last, ticket ) VALUES ( ?, ?, ?, ?, ? )',
+					( ( description, key, seconds, last, ticket ) for description, seconds, last, ticket in shares )
+					)
+
+	def _records( self, where = '', params = () ):
+		# with a single max() sqlite takes the bare ticket column from the row holding the maximum, the latest use
+		cursor = self.connect().execute(
+				'SELECT description, SUM( seconds ), MAX( last ), ticket FROM shares {} GROUP BY description'.format( where ),
+				params
+				)
+		return { description: { 'seconds': seconds, 'last': last, 'ticket': ticket } for description, seconds, last, ticket in cursor }
+
+	def get( self, description ):
+		return self._records( 'WHERE description = ?', ( description, ) ).get( description )
+
+	def choices( self, search = None ):
+		""" Descriptions, most recently used first, only the ones containing `search` (in them or their ticket) if given. """
+		records = self._records()
+		if search:
+			search = search.lower()
+			descriptions = [
+				description for description, record in records.items()
+				if search in description.lower() or search in ( record['ticket'] or '' ).lower()
+			]
+		else:
+			descriptions = list( records )
+		descriptions.sort( key = lambda description: records[description]['last'], reverse = True )
+		return descriptions
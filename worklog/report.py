@@ -1,22 +1,40 @@
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from worklog import color
-from worklog.state import GoHome, DummyRightNow
-from worklog.time_utils import Duration
+from worklog.issues import IssueCache
+from worklog.rollup import RollupCache
+from worklog.state import GoHome, DummyRightNow, WorklogRange
+from worklog.time_utils import Duration, now
 
 class Report:
 
 
-	def __init__( self, worklog, config ):
+	def __init__( self, worklog, config, summary = False ):
 		self._entries = []
 		self._rollup = dict()
 		self.worklog = worklog
+		self.config = config.snapshot() if config else config
+		self.summary = summary
+		self.rollup_cache = None
+		self.issues = None
+		if self.config and self.config.features.get( 'issue-titles' ):
+			self.issues = IssueCache( self.config ).load()
 		self.total = timedelta( seconds = 0 )
-		self._make_entries()
+		if summary and isinstance( worklog, WorklogRange ):
+			self._make_rollup()
+		else:
+			self._make_entries()
 
 	@property
 	def header( self ):
+		if isinstance( self.worklog, WorklogRange ):
+			return '{} {} {} {}'.format(
+					color.bold( 'Worklog Report for' ),
+					color.purple( self.worklog.start.strftime( '%F' ), bold = True ),
+					color.bold( 'to' ),
+					color.purple( self.worklog.end.strftime( '%F' ), bold = True )
+					)
 		return '{} {}'.format(
 				color.bold( 'Worklog Report for' ),
 				color.purple( self.worklog.when.strftime( '%F' ), bold = True )
@@ -28,27 +46,50 @@ class Report:
 
 
 	def _make_entries( self ):
-		if len( self.worklog ) == 0:
-			return '\tno entries'
-		else:
-			for task, next_task in self.worklog.pairwise():
-				if isinstance( task, GoHome ):
-					continue
-				if isinstance( next_task, DummyRightNow ):
-					colorize_end_time = color.yellow
+		multiple_days = isinstance( self.worklog, WorklogRange )
+		day = None
+		for task, next_task in self.worklog.pairwise():
+			if isinstance( task, GoHome ):
+				continue
+			if multiple_days and task.start.date() != day:
+				day = task.start.date()
+				self._entries.append( color.purple( day.strftime( '%F' ) ) )
+			if isinstance( next_task, DummyRightNow ):
+				colorize_end_time = color.yellow
+			else:
+				colorize_end_time = color.green
+			delta = next_task.start - task.start
+			if task.include_in_rollup():
+				self.total += delta
+				if task.description not in self._rollup:
+					self._rollup[task.description] = delta
 				else:
-					colorize_end_time = color.green
-				delta = next_task.start - task.start
-				if task.include_in_rollup():
-					self.total += delta
-					if task.description not in self._rollup:
-						self._rollup[task.description] = delta
-					else:
-						self._rollup[task.description] += delta
-				if delta > timedelta():
-					if not task.logged:
-						task.logged = False
-					self._add_entry( delta, task, next_task )
+					self._rollup[task.description] += delta
+			if delta > timedelta():
+				if not task.logged:
+					task.logged = False
+				self._add_entry( delta, task, next_task )
+
+	def _make_rollup( self ):
+		# past days rarely change, so take their totals from the cache rather than rereading every task
+		with RollupCache( self.config ) as self.rollup_cache:
+			open_task = None
+			for worklog in self.worklog.worklogs():
+				rollup = self.rollup_cache.get( worklog )
+				if open_task and rollup['first']:
+					self._close_open_task( open_task, datetime.fromisoformat( rollup['first'] ) )
+				self.total += timedelta( seconds = rollup['total'] )
+				for description, seconds in rollup['descriptions'].items():
+					self._rollup[description] = self._rollup.get( description, timedelta() ) + timedelta( seconds = seconds )
+				open_task = rollup['open']
+			if open_task:
+				self._close_open_task( open_task, now() )
+
+	def _close_open_task( self, open_task, end ):
+		delta = end - datetime.fromisoformat( open_task['start'] )
+		if open_task['rollup']:
+			self.total += delta
+			self._rollup[open_task['description']] = self._rollup.get( open_task['description'], timedelta() ) + delta
 
 	def _add_entry( self, delta, task, next_task ):
 		start_time = color.green( task.start.strftime( '%H:%M' ) )
@@ -58,6 +99,10 @@ class Report:
 		duration = Duration( delta ).colorized()
 		duration_close = color.black( ')', intense = True )
 		is_logged = {True: color.green('*'), False: color.red('*')}[task.logged]
+		description = task.description
+		title = self.issues and task.ticket and self.issues.summary( task.ticket )
+		if title:
+			description = '{}  {}'.format( description, color.faint( title ) )
 		entry = '	{:5s} {} {:5s} {}{!s:>7}{} {} {}  {}'.format(
 				start_time,
 				start_end_delimiter,
@@ -67,7 +112,7 @@ class Report:
 				duration_close,
 				is_logged,
 				task.ticket,
-				task.description
+				description
 				)
 		self._entries.append( entry )
 
@@ -99,4 +144,6 @@ class Report:
 
 
 	def __str__( self ):
+		if self.summary:
+			return '\n'.join( (self.header, self.footer, self.rollup) )
 		return '\n'.join( (self.header, self.entries, self.footer, self.rollup) )
@@ -0,0 +1,102 @@
+
+import json
+import os
+
+from worklog import WORKLOG_DIR
+from worklog import write_atomically
+
+
+DEFAULT_ROLLUP_CACHE = os.path.join( WORKLOG_DIR, 'rollup-cache.json' )
+
+
+
+def day_rollup( worklog ):
+	""" Time spent in a single day's worklog, in seconds, in total and by description and ticket.
+
+	Only closed segments are counted. A task still open at the end of the day is returned as `open` so whoever
+	combines days can close it with the next day's first task (or now).
+
+	"""
+	from worklog.state import GoHome, DummyRightNow
+	total = 0
+	descriptions = {}
+	tickets = {}
+	open_task = None
+	for task, next_task in worklog.pairwise():
+		if isinstance( task, GoHome ):
+			continue
+		if isinstance( next_task, DummyRightNow ):
+			open_task = {
+				'start': task.start.isoformat(),
+				'description': task.description,
+				'ticket': task.ticket,
+				'rollup': task.include_in_rollup()
+			}
+			continue
+		seconds = int( ( next_task.start - task.start ).total_seconds() )
+		if task.include_in_rollup():
+			total += seconds
+			descriptions[task.description] = descriptions.get( task.description, 0 ) + seconds
+		if task.ticket and seconds > 0:
+			tickets[task.ticket] = tickets.get( task.ticket, 0 ) + seconds
+	return {
+		'first': worklog[0].start.isoformat() if len( worklog ) else None,
+		'total': total,
+		'descriptions': descriptions,
+		'tickets': tickets,
+		'open': open_task
+	}
+
+
+
+class RollupCache:
+	""" Day rollups keyed by the day's file, only recomputed when the file's mtime or size changes. """
+
+	def __init__( self, config ):
+		self.config = config
+		filename = config.state.get( 'rollup_cache' ) or DEFAULT_ROLLUP_CACHE
+		self.filename = os.path.expandvars( os.path.expanduser( filename ) )
+		self.entries = {}
+		self.hits = 0
+		self.misses = 0
+		self.dirty = False
+
+	def __enter__( self ):
+		self.load()
+		return self
+
+	def __exit__( self, exc_type, exc_value, exc_traceback ):
+		if not exc_type and self.dirty:
+			self.dump()
+
+	def load( self ):
+		if os.path.exists( self.filename ):
+			with open( self.filename, 'r' ) as file_handle:
+				self.entries = json.load( file_handle )
+		return self
+
+	def dump( self ):
+		write_atomically( self.filename, json.dumps( self.entries ) )
+		self.dirty = False
+
+	def get( self, worklog ):
+		""" The rollup for an (unloaded) worklog, loading and summarizing the day only on a cache miss. """
+		if worklog.storage == 'sqlite':
+			# nothing on disk to key the cache on, and the database is quick to read anyway
+			self.misses += 1
+			worklog.load()
+			return day_rollup( worklog )
+		signature = worklog.signature()
+		entry = self.entries.get( worklog.filename )
+		if entry is not None and entry['signature'] == signature:
+			self.hits += 1
+			return entry['rollup']
+		self.misses += 1
+		worklog.load()
+		rollup = day_rollup( worklog )
+		self.entries[worklog.filename] = { 'signature': signature, 'rollup': rollup }
+		self.dirty = True
+		return rollup
+
+	def __str__( self ):
+		return 'rollup cache: {:d} hits, {:d} misses'.format( self.hits, self.misses )
@@ -0,0 +1,118 @@
+
+from datetime import datetime
+import os
+import re
+
+from worklog import WORKLOG_DIR
+from worklog.index import SqliteIndex
+
+
+DEFAULT_SEARCH_INDEX = os.path.join( WORKLOG_DIR, 'search.sqlite' )
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS segments (
+	day TEXT NOT NULL,
+	position INTEGER NOT NULL,
+	start TEXT NOT NULL,
+	seconds INTEGER,
+	ticket TEXT,
+	description TEXT NOT NULL,
+	PRIMARY KEY ( day, position )
+);
+CREATE TABLE IF NOT EXISTS postings (
+	term TEXT NOT NULL,
+	day TEXT NOT NULL,
+	position INTEGER NOT NULL,
+	PRIMARY KEY ( term, day, position )
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_day ON postings ( day );
+'''
+
+# hyphenated words (and tickets) are indexed whole as well as by their parts
+WORD_RE = re.compile( r'\w+(?:-\w+)*' )
+
+
+
+def tokens( text ):
+	""" The index terms of `text`, lower cased. """
+	found = set()
+	for word in WORD_RE.findall( text.lower() ):
+		found.add( word )
+		if '-' in word:
+			found.update( part for part in word.split( '-' ) if part )
+	return found
+
+
+
+def day_segments( worklog ):
+	""" ( start, seconds, ticket, description ) of every segment in `worklog`, seconds is None while it is open. """
+	from worklog.state import GoHome, DummyRightNow
+	segments = []
+	for task, next_task in worklog.pairwise():
+		if isinstance( task, GoHome ):
+			continue
+		seconds = None
+		if not isinstance( next_task, DummyRightNow ):
+			seconds = int( ( next_task.start - task.start ).total_seconds() )
+		segments.append( ( task.start.isoformat(), seconds, task.ticket or None, task.description or '' ) )
+	return segments
+
+
+
+class SearchIndex( SqliteIndex ):
+	""" An inverted index of every task description and ticket in the worklog history, kept in a sqlite database.
+
+	Each term has a posting for every segment it appears in, by day and position in that day. The segments themselves
+	are kept too, so a search never has to open a worklog, and saving a day only replaces that day's rows. Built from
+	every worklog the first time it is needed.
+
+	"""
+
+	SCHEMA = SCHEMA
+	CONFIG_KEY = 'search_index'
+	DEFAULT_FILENAME = DEFAULT_SEARCH_INDEX
+
+	def update( self, worklog ):
+		key = worklog.when.strftime( '%Y-%m-%d' )
+		segments = day_segments( worklog )
+		connection = self.connect()
+		indexed = connection.execute(
+				'SELECT start, seconds, ticket, description FROM segments WHERE day = ? ORDER BY position',
+				( key, )
+				).fetchall()
+		if indexed == segments:
+			return None
+		with connection:
+			connection.execute( 'DELETE FROM segments WHERE day = ?', ( key, ) )
+			connection.execute( 'DELETE FROM postings WHERE day = ?', ( key, ) )
+			connection.executemany(
+					'INSERT INTO segments ( day, position, start, seconds, ticket, description ) VALUES ( ?, ?, ?, ?, ?, ? )',
+					( ( key, position ) + segment for position, segment in enumerate( segments ) )
+					)
+			connection.executemany(
+					'INSERT INTO postings ( term, day, position ) VALUES ( ?, ?, ? )',
+					(
+						( term, key, position )
+						for position, ( start, seconds, ticket, description ) in enumerate( segments )
+						for term in tokens( description ) | tokens( ticket or '' )
+					)
+					)
+
+	def search( self, query ):
+		""" Segments where every word of `query` starts a term of the description or ticket, newest first.
+
+		Each one is ( start, seconds, ticket, description ) with start as a datetime.
+
+		"""
+		words = sorted( set( WORD_RE.findall( query.lower() ) ) )
+		if not words:
+			return []
+		# a range over the primary key finds every term a word is the start of
+		matches = ' INTERSECT '.join( 'SELECT DISTINCT day, position FROM postings WHERE term >= ? AND term < ?' for _ in words )
+		params = [ bound for word in words for bound in ( word, word + chr( 0x10ffff ) ) ]
+		cursor = self.connect().execute(
+				'SELECT start, seconds, ticket, description FROM segments JOIN ( {} ) USING ( day, position ) '
+				'ORDER BY day DESC, position DESC'.format( matches ),
+				params
+				)
+		return [ ( datetime.fromisoformat( start ), seconds, ticket, description ) for start, seconds, ticket, description in cursor ]
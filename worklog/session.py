@@ -0,0 +1,108 @@
+
+import json
+import os
+import threading
+
+from requests.auth import AuthBase, _basic_auth_str
+
+from worklog import WORKLOG_DIR
+from worklog import write_atomically
+
+
+DEFAULT_SESSION_CACHE = os.path.join( WORKLOG_DIR, 'jira-session.json' )
+
+
+
+class SessionCache:
+	""" The Jira session cookies and server info from earlier uploads, so the next one can skip the handshake.
+
+	The file holds live session cookies, it is only ever readable by its owner.
+
+	"""
+
+	def __init__( self, config, server ):
+		self.config = config
+		self.server = server
+		filename = config.jira.get( 'session_cache' ) or DEFAULT_SESSION_CACHE
+		self.filename = os.path.expandvars( os.path.expanduser( filename ) )
+		self.cookies = {}
+		self.server_info = None
+		self._lock = threading.Lock()
+
+	def load( self ):
+		if os.path.exists( self.filename ):
+			with open( self.filename, 'r' ) as file_handle:
+				state = json.load( file_handle )
+			# a session for some other server (or user) is no use to us
+			if state.get( 'server' ) == self.server and state.get( 'username' ) == self.config.jira.get( 'username' ):
+				self.cookies = state.get( 'cookies', {} )
+				self.server_info = state.get( 'server_info' )
+		return self
+
+	def dump( self ):
+		write_atomically( self.filename, json.dumps( {
+			'server': self.server,
+			'username': self.config.jira.get( 'username' ),
+			'cookies': self.cookies,
+			'server_info': self.server_info
+		} ), mode = 0o600 )
+
+	def attach( self, jira ):
+		""" Keep the cache up to date with the cookies the server hands `jira`'s session. """
+		session = jira._session
+		def remember( response, **kwargs ):
+			cookies = session.cookies.get_dict()
+			with self._lock:
+				if cookies and cookies != self.cookies:
+					self.cookies = cookies
+					self.dump()
+			return response
+		session.hooks['response'].append( remember )
+
+	def remember_server_info( self, server_info ):
+		self.server_info = { 'versionNumbers': server_info['versionNumbers'], 'deploymentType': server_info.get( 'deploymentType' ) }
+		with self._lock:
+			self.dump()
+
+	def restore_server_info( self, jira ):
+		jira._version = tuple( self.server_info['versionNumbers'] )
+		jira.deploymentType = self.server_info.get( 'deploymentType' )
+
+
+
+class LazyBasicAuth( AuthBase ):
+	""" HTTP basic auth that is only sent (and the password only asked for) once the server turns a cached session down. """
+
+	def __init__( self, username, password ):
+		self.username = username
+		self._password = password
+		self._header = None
+		self._lock = threading.Lock()
+
+	def authenticate( self ):
+		with self._lock:
+			if self._header is None:
+				self._header = _basic_auth_str( self.username, self._password() )
+		return self._header
+
+	def __call__( self, request ):
+		if self._header is not None:
+			request.headers['Authorization'] = self._header
+		else:
+			request.register_hook( 'response', self._retry_with_credentials )
+		return request
+
+	def _retry_with_credentials( self, response, **kwargs ):
+		if response.status_code != 401:
+			return response
+		# drain the refused response so its connection can be reused for the retry
+		response.content
+		response.close()
+		request = response.request.copy()
+		request.headers.pop( 'Cookie', None )
+		request.headers['Authorization'] = self.authenticate()
+		request.hooks = { 'response': [] }
+		retry = response.connection.send( request, **kwargs )
+		retry.history.append( response )
+		retry.request = request
+		return retry
@@ -1,17 +1,31 @@
 
+import bisect
 from collections.abc import MutableSequence
 from datetime import date, datetime, timedelta
+import glob
 import json
 import os
 import re
-import pprint
 
 
 from worklog import NO_ROLLUP_KEYWORDS
+from worklog import file_signature, write_atomically
+from worklog import alias
+from worklog import completion
+from worklog import status
+from worklog.tickets import ticket_matcher
+from worklog.manifest import Manifest
+from worklog.recent import RecentDescriptions
 from worklog.time_utils import now
 
 
 
+JOURNAL_COMPACT_THRESHOLD = 1000
+MEMO_SIZE = 31
+SCHEMA_VERSION = 2
+
+
+
 class Abort( Exception ):
 	pass
 
@@ -22,11 +36,17 @@ def _get_cls( cls_name ):
 
 
 
+def _start_key( task ):
+	return task.start
+
+
+
 class Task:
 
-	
+	__slots__ = ( 'config', 'start', 'ticket', 'description', 'logged' )
+
 	def __init__( self, start = None, ticket = False, description = None, logged = None, config = None ):
-		self.config = config
+		self.config = config.snapshot() if config is not None else None
 		self.start = start or now()
 		self.ticket = ticket
 		self.description = (description or '').strip()
@@ -50,76 +70,72 @@ class Task:
 	def _pull_ticket_from_description( self ):
 		if not self.description:
 			return None
-		ticket_re = re.compile( '({})-[0-9]+'.format( '|'.join( self.config.jira.get( 'projects', [] ) ) ) )
-		re_match = ticket_re.search( self.description )
+		ticket_re = ticket_matcher( self.config.jira.get( 'projects' ) )
+		re_match = ticket_re and ticket_re.search( self.description )
 		if re_match:
 			self.ticket = re_match.group()
 
 
 	def _resolve_alias( self ):
-		resolved = self.config.aliases.get( self.description.split()[0] )
+		aliases = alias.index( self.config )
+		resolved = aliases.get( aliases.match( self.description ) )
 		if not resolved:
-			resolved = self.config.aliases.get( self.description )
-			if not resolved:
-				return None
+			return None
 		self.description = ' '.join( ( resolved, self.description ) )
 
 	
 	def __getstate__( self ):
-		start = self._start_to_dict()
-		return { '__klass__': self.__class__.__name__, 'start': start, 'ticket': self.ticket, 'description': self.description, 'logged': self.logged }
+		return { '__klass__': self.__class__.__name__, 'start': self._start_to_str(), 'ticket': self.ticket, 'description': self.description, 'logged': self.logged }
 
 	
 	def __setstate__( self, state ):
-		state.pop('__klass__')
-		self._start_from_dict( state.pop('start') )
-		self.__dict__.update( state )
+		# state is read, never changed, the daemon hands the same cached state to every load of a day
+		self._start_from_state( state['start'] )
+		for attr, value in state.items():
+			if attr not in ( '__klass__', 'start' ):
+				setattr( self, attr, value )
 
 	
-	def _start_to_dict( self ):
+	def _start_to_str( self ):
 		if not self.start:
 			return None
-		return {
-			"__klass__": "datetime",
-			"year": self.start.year,
-			"month": self.start.month,
-			"day": self.start.day,
-			"hour": self.start.hour,
-			"minute": self.start.minute,
-			"second": self.start.second,
-			"microsecond": self.start.microsecond
-		}
+		return self.start.isoformat()
 
 	
-	def _start_from_dict( self, datetime_dict ):
-		if not datetime_dict:
+	def _start_from_state( self, start ):
+		if not start:
 			return None
-		datetime_dict.pop('__klass__')
-		year = datetime_dict.pop( 'year' )
-		month = datetime_dict.pop( 'month' )
-		day = datetime_dict.pop( 'day' )
-		self.start = datetime( year, month, day, **datetime_dict )
+		if isinstance( start, dict ):
+			# schema version 1 exploded the datetime into its fields
+			fields = { key: value for key, value in start.items() if key not in ( '__klass__', 'year', 'month', 'day' ) }
+			self.start = datetime( start['year'], start['month'], start['day'], **fields )
+		else:
+			self.start = datetime.fromisoformat( start )
 
 	
 	def __repr__(self):
+		import pprint
 		return pprint.pformat(self.__getstate__())
 
 
 
 class GoHome( Task ):
 
-	
+	__slots__ = ()
+
 	def __getstate__( self ):
-		return { '__klass__': self.__class__.__name__, 'start': self._start_to_dict() }
+		return { '__klass__': self.__class__.__name__, 'start': self._start_to_str() }
 
 	
 	def __setstate__( self, state ):
-		self._start_from_dict( state['start'] )
+		self._start_from_state( state['start'] )
 
 
 
 class DummyRightNow( Task ):
 
+	__slots__ = ()
+
 	def __init__( self ):
 		Task.__init__( self, start = now(), ticket = '', description = '', logged = True, config = None )
 
@@ -130,18 +146,60 @@ class DummyRightNow( Task ):
 		pass
 
 
+def day_files( config ):
+	""" Yield the day and filename of every JSON worklog file on disk. """
+	pattern = config.state.store_filename_format.format( '*' )
+	pattern = os.path.expandvars( os.path.expanduser( pattern ) )
+	prefix, _, suffix = pattern.partition( '*' )
+	# days kept in journal storage may not have been compacted into a file of their own yet
+	journals = [ filename[:-len( '.journal' )] for filename in glob.glob( pattern + '.journal' ) ]
+	for filename in sorted( set( glob.glob( pattern ) + journals ) ):
+		when = filename[len( prefix ):len( filename ) - len( suffix )]
+		try:
+			yield datetime.strptime( when, config.state.when_format ).date(), filename
+		except ValueError:
+			continue
+
+
+
+def history( config ):
+	""" Every day with a worklog, oldest first. """
+	if config.state.get( 'storage' ) == 'sqlite':
+		from worklog import database
+		return database.days( config )
+	return sorted( day for day, filename in day_files( config ) )
+
+
+
+def resolve_day( when = None ):
+	""" Turn a DATE string, an offset in days from today or a date into a date, defaulting to today. """
+	if when is None:
+		return date.today()
+	elif isinstance(when, datetime):
+		return when.date()
+	elif isinstance(when, date):
+		return when
+	elif re.findall("[0-9]{4}-[0-9]{2}-[0-9]{2}", when):
+		return datetime.strptime(when, "%Y-%m-%d").date()
+	else:
+		return date.today()+timedelta( days=int(when) )
+
+
+
 class Worklog( MutableSequence ):
 
-	def __init__( self, when = None, config = None ):
+	# filename -> ( file signature, state, journal length ) of recently used days, only long running processes
+	# (see worklog.daemon) set this up, everything else reads the day files every time
+	memo = None
+
+	def __init__( self, when = None, config = None, storage = None ):
 		self.store = []
-		self.config = config
-		if when is None:
-			self.when = date.today()
-		elif isinstance(when, str):
-			if re.findall("[0-9]{4}-[0-9]{2}-[0-9]{2}", when):
-				self.when = datetime.strptime(when, "%Y-%m-%d").date()
-			else:
-				self.when = datetime.today()+timedelta( days=int(when) )
+		self.config = config.snapshot()
+		self.storage = storage or self.config.state.get( 'storage' ) or 'json'
+		self._journal = []
+		self._persisted = {}
+		self._journal_length = 0
+		self.when = resolve_day( when )
 		filename = self.config.state.store_filename_format.format( self.when.strftime( self.config.state.when_format ) )
 		self.filename = os.path.expandvars( os.path.expanduser( filename ) )
 
@@ -149,6 +207,13 @@ class Worklog( MutableSequence ):
 		self.load()
 		return self
 
+	@property
+	def exists(self):
+		if self.storage == 'sqlite':
+			from worklog import database
+			return database.has_day( self.config, self.when )
+		return os.path.exists( self.filename ) or ( self.journaled and os.path.exists( self.journal_filename ) )
+
 	def __exit__(self, exc_type, exc_value, exc_traceback ):
 		if not exc_type:
 			self.dump()
@@ -157,19 +222,38 @@ class Worklog( MutableSequence ):
 		return self.store[index]
 
 	def __setitem__(self, index, value ):
+		index = range( len( self.store ) )[index]
+		self._persisted.pop( id( self.store[index] ), None )
 		self.store[index] = value
+		self._record( 'set', value, index = index )
 
 	def __delitem__(self, index ):
+		index = range( len( self.store ) )[index]
+		self._persisted.pop( id( self.store[index] ), None )
 		del self.store[index]
+		self._journal.append( { 'op': 'delete', 'index': index } )
 
 	def __len__(self):
 		return len(self.store)
 
 	def insert(self, task):
 		if task:
-			self.store.append(task)
-			self.store = [ x for x in self.store if x ]
-			self.store.sort( key=lambda t: t.start )
+			# the store is always sorted by start, so find the spot instead of resorting everything
+			bisect.insort_right( self.store, task, key=_start_key )
+			self._record( 'insert', task )
+
+	def extend(self, tasks):
+		""" Insert many tasks at once, sorting the store a single time. """
+		tasks = [ task for task in tasks if task ]
+		self.store.extend( tasks )
+		self.store.sort( key=_start_key )
+		for task in tasks:
+			self._record( 'insert', task )
+
+	def _record( self, op, task, **kwargs ):
+		state = task.__getstate__()
+		self._journal.append( dict( op = op, task = state, **kwargs ) )
+		self._persisted[id( task )] = state
 
 	def pairwise(self):
 		offset = self.store[1:]
@@ -177,37 +261,248 @@ class Worklog( MutableSequence ):
 		return zip(self.store, offset)
 
 
+	@property
+	def journal_filename( self ):
+		return self.filename + '.journal'
+
+
+	@property
+	def journaled( self ):
+		""" Whether this worklog is stored as a snapshot plus an append-only journal of changes. """
+		return self.storage == 'journal'
+
+
 	def load( self ):
-		if not os.path.exists( self.filename ):
-			return None
-		with open(self.filename, 'r') as file_handle:
-			state = json.load( file_handle )
+		if self.storage == 'sqlite':
+			from worklog import database
+			database.load( self )
+		else:
+			signature = self.signature()
+			if not self._recall( signature ):
+				if os.path.exists( self.filename ):
+					with open(self.filename, 'r') as file_handle:
+						state = json.load( file_handle )
+					self.__setstate__( state )
+				if self.journaled:
+					self._replay_journal()
+				self._remember( signature )
+		self._journal = []
+		self._persisted = { id( task ): task.__getstate__() for task in self.store }
+
+
+	def signature( self ):
+		""" What the files this worklog is stored in look like on disk, to tell if someone else changed them. """
+		return file_signature( self.filename, self.journal_filename )
+
+
+	def _recall( self, signature ):
+		if self.memo is None or self.filename not in self.memo:
+			return False
+		remembered_signature, state, journal_length = self.memo[self.filename]
+		if remembered_signature != signature:
+			return False
 		self.__setstate__( state )
+		self._journal_length = journal_length
+		return True
+
+
+	def _remember( self, signature ):
+		if self.memo is None:
+			return None
+		self.memo.pop( self.filename, None )
+		self.memo[self.filename] = ( signature, self.__getstate__(), self._journal_length )
+		while len( self.memo ) > MEMO_SIZE:
+			self.memo.pop( next( iter( self.memo ) ) )
+
+
+	@property
+	def changed( self ):
+		""" Whether anything was inserted, replaced, deleted or modified in place since the last load or dump. """
+		if self._journal:
+			return True
+		return any( task.__getstate__() != self._persisted.get( id( task ) ) for task in self.store )
 
 
 	def dump( self ):
+		if not self.changed:
+			# read only commands (report, ...) leave the day and its indexes as they were
+			return None
+		if self.storage == 'sqlite':
+			from worklog import database
+			database.dump( self )
+		elif self.journaled:
+			self._append_journal()
+			if self._journal_length > self.config.state.get( 'journal_compact_threshold', JOURNAL_COMPACT_THRESHOLD ):
+				self.compact()
+		else:
+			self._write_snapshot()
+		if not self.journaled:
+			self._journal = []
+			self._persisted = { id( task ): task.__getstate__() for task in self.store }
+		if self.storage != 'sqlite':
+			self._remember( self.signature() )
+		self._update_indexes()
+
+
+	def _update_indexes( self ):
+		# until a range of days, resume or search first builds them from the whole history, there is nothing to keep up
+		# to date
+		manifest = Manifest( self.config )
+		if manifest.exists:
+			with manifest:
+				manifest.update( self )
+		recent = RecentDescriptions( self.config )
+		if recent.exists:
+			with recent:
+				recent.update( self )
+		from worklog.search import SearchIndex
+		search_index = SearchIndex( self.config )
+		if search_index.exists:
+			with search_index:
+				search_index.update( self )
+		if self.when == date.today():
+			status.write( self )
+			completion.write_descriptions( self )
+
+
+	def compact( self ):
+		""" Fold the journal back into the snapshot file and truncate the journal. """
+		self._write_snapshot()
+		if os.path.exists( self.journal_filename ):
+			os.remove( self.journal_filename )
+		self._journal = []
+		self._journal_length = 0
+		self._persisted = { id( task ): task.__getstate__() for task in self.store }
+
+
+	def _write_snapshot( self ):
 		kwargs = {}
 		if self.config.features.get( 'pretty-print' ):
 			kwargs = { 'sort_keys': True, 'indent': 4 }
 		state = self.__getstate__()
-		if state:
-			with open(self.filename, 'w') as file_handle:
-				json.dump( state, file_handle, **kwargs )
+		if state['tasks']:
+			write_atomically( self.filename, json.dumps( state, **kwargs ) )
+		elif os.path.exists( self.filename ):
+			# every task was deleted, so is the day
+			os.remove( self.filename )
+
+
+	def _replay_journal( self ):
+		if not os.path.exists( self.journal_filename ):
+			return None
+		with open( self.journal_filename, 'r' ) as file_handle:
+			for line in file_handle:
+				try:
+					record = json.loads( line )
+				except ValueError:
+					# a torn final record from an interrupted write, everything before it is intact
+					break
+				self._apply( record )
+				self._journal_length += 1
+
+
+	def _apply( self, record ):
+		if record['op'] == 'delete':
+			del self.store[record['index']]
+			return None
+		task = _get_cls( record['task']['__klass__'] )()
+		task.__setstate__( record['task'] )
+		if record['op'] == 'insert':
+			bisect.insort_right( self.store, task, key=_start_key )
+		elif record['op'] == 'set':
+			self.store[record['index']] = task
+
+
+	def _append_journal( self ):
+		records = self._journal
+		# pick up tasks that were modified in place since they were last journaled (eg: marked as logged by an upload)
+		for index, task in enumerate( self.store ):
+			state = task.__getstate__()
+			if state != self._persisted.get( id( task ) ):
+				records.append( { 'op': 'set', 'index': index, 'task': state } )
+				self._persisted[id( task )] = state
+		if records:
+			with open( self.journal_filename, 'a' ) as file_handle:
+				file_handle.write( ''.join( json.dumps( record ) + '\n' for record in records ) )
+			self._journal_length += len( records )
+		self._journal = []
 
 
 	def __getstate__( self ):
-		state = []
+		tasks = []
 		for item in self.store:
 			if item:
-				state.append( item.__getstate__() )
-		return state
+				tasks.append( item.__getstate__() )
+		return { 'version': SCHEMA_VERSION, 'tasks': tasks }
 
 
 	def __setstate__( self, state ):
-		for item in state:
+		if isinstance( state, list ):
+			# schema version 1 was a bare list of tasks
+			state = { 'version': 1, 'tasks': state }
+		for item in state['tasks']:
 			cls = _get_cls( item['__klass__'] )()
 			cls.__setstate__( item )
 			self.store.append( cls )
 
 	def __repr__( self ):
+		import pprint
 		return pprint.pformat( [ x.__getstate__() for x in self.store ] )
+
+
+
+class WorklogRange:
+	""" The worklogs for every day from `start` through `end` inclusive.
+
+	Day files are opened lazily and one at a time, days without a file are skipped.
+
+	"""
+
+	def __init__( self, start = None, end = None, config = None ):
+		self.config = config.snapshot()
+		self.start = resolve_day( start )
+		self.end = resolve_day( end )
+		if self.end < self.start:
+			self.start, self.end = self.end, self.start
+
+	def days( self ):
+		day = self.start
+		while day <= self.end:
+			yield day
+			day += timedelta( days = 1 )
+
+	def worklogs( self ):
+		""" The (not yet loaded) worklogs of the days in the range that have one. """
+		if self.config.state.get( 'storage' ) == 'sqlite':
+			# the database knows which days have tasks, no need to probe each one
+			from worklog import database
+			days = database.days( self.config, self.start, self.end )
+		else:
+			with Manifest( self.config ) as manifest:
+				if not manifest.loaded:
+					# saving a day only keeps an existing manifest up to date, it has to start out with every day
+					manifest.reindex()
+			days = manifest.days_between( self.start, self.end )
+		for day in days:
+			worklog = Worklog( when = day, config = self.config )
+			if worklog.exists:
+				yield worklog
+
+	def __iter__( self ):
+		for worklog in self.worklogs():
+			worklog.load()
+			yield worklog
+
+	def tasks( self ):
+		for worklog in self:
+			yield from worklog
+
+	def pairwise( self ):
+		# a task left open at the end of a day runs until the first task of the next day with entries
+		previous = None
+		for task in self.tasks():
+			if previous is not None:
+				yield previous, task
+			previous = task
+		if previous is not None:
+			yield previous, DummyRightNow()
@@ -0,0 +1,68 @@
+
+from datetime import date, datetime
+import os
+
+from worklog import WORKLOG_DIR
+from worklog import write_atomically
+
+
+STATUS_PATH = os.environ.get( 'WORKLOG_STATUS' ) or os.path.join( WORKLOG_DIR, 'status' )
+DEFAULT_FORMAT = '{ticket} {description} {elapsed} ({total} today)'
+IDLE_FORMAT = 'Not working ({total} today)'
+
+
+
+def write( worklog ):
+	""" Save what today's `worklog` is up to in one short line, for `status` to read without loading anything else.
+
+	Fields are tab separated: the day, closed time so far in seconds, then the open task's start, whether it counts
+	towards the total, its ticket and its description (all empty when nothing is open).
+
+	"""
+	from worklog.rollup import day_rollup
+	rollup = day_rollup( worklog )
+	fields = [ worklog.when.isoformat(), str( rollup['total'] ), '', '', '', '' ]
+	if rollup['open']:
+		fields[2:] = [
+			rollup['open']['start'],
+			'1' if rollup['open']['rollup'] else '0',
+			rollup['open']['ticket'] or '',
+			rollup['open']['description']
+		]
+	line = '\t'.join( ' '.join( field.split() ) for field in fields ) + '\n'
+	write_atomically( STATUS_PATH, line )
+
+
+
+def _duration( seconds ):
+	hours, seconds = divmod( int( seconds ), 3600 )
+	minutes = seconds // 60
+	return ' '.join( part for part in ( hours and '{:d}h'.format( hours ), minutes and '{:d}m'.format( minutes ) ) if part ) or '0m'
+
+
+
+def show( format = None ):
+	""" The current task, how long it has been going and today's total, formatted with `format`. """
+	try:
+		with open( STATUS_PATH, 'r' ) as file_handle:
+			day, total, start, rollup, ticket, description = file_handle.read().rstrip( '\n' ).split( '\t' )
+	except ( FileNotFoundError, ValueError ):
+		day = None
+	if day != date.today().isoformat():
+		# nothing has been logged today
+		day, total, start, rollup, ticket, description = None, 0, '', '', '', ''
+	elapsed = 0
+	if start:
+		now = datetime.now().replace( second = 0, microsecond = 0 )
+		elapsed = max( 0, ( now - datetime.fromisoformat( start ) ).total_seconds() )
+	total = int( total ) + ( elapsed if rollup == '1' else 0 )
+	fields = {
+		'ticket': ticket,
+		'description': description,
+		'start': start[11:16],
+		'elapsed': _duration( elapsed ) if start else '',
+		'total': _duration( total )
+	}
+	if format is None:
+		format = DEFAULT_FORMAT if start else IDLE_FORMAT
+	return ' '.join( format.format( **fields ).split() )
@@ -0,0 +1,70 @@
+
+import re
+import time
+
+
+# sorted project keys -> compiled ticket regex, so it is only ever built once per list of projects
+_matchers = {}
+
+
+
+def _trie_pattern( node ):
+	""" A regex matching every key stored in the trie `node`, with shared prefixes factored out. """
+	alternatives = [ re.escape( char ) + _trie_pattern( child ) for char, child in sorted( node.items() ) if char ]
+	if not alternatives:
+		return ''
+	pattern = alternatives[0] if len( alternatives ) == 1 else '(?:{})'.format( '|'.join( alternatives ) )
+	if '' in node:
+		# a key ends here and longer ones carry on
+		pattern = '(?:{})?'.format( pattern )
+	return pattern
+
+
+
+def ticket_matcher( projects ):
+	""" A compiled regex finding tickets (eg: ABC-123) of any of `projects`, or None if there are no projects. """
+	projects = tuple( sorted( set( projects or () ) ) )
+	if not projects:
+		return None
+	if projects not in _matchers:
+		trie = {}
+		for project in projects:
+			node = trie
+			for char in project:
+				node = node.setdefault( char, {} )
+			node[''] = {}
+		_matchers[projects] = re.compile( r'\b{}-[0-9]+\b'.format( _trie_pattern( trie ) ) )
+	return _matchers[projects]
+
+
+
+def backfill( config, days, dry_run = False ):
+	""" Fill in the ticket of tasks without one from their description, loading and saving one day at a time.
+
+	Returns the number of tasks and days changed, and the seconds it took.
+
+	"""
+	from worklog.state import GoHome, Worklog
+	start = time.perf_counter()
+	matcher = ticket_matcher( config.jira.get( 'projects' ) )
+	tasks_changed = 0
+	days_changed = 0
+	for day in days if matcher else ():
+		worklog = Worklog( when = day, config = config )
+		if not worklog.exists:
+			continue
+		worklog.load()
+		changed = 0
+		for task in worklog:
+			if isinstance( task, GoHome ) or task.ticket or not task.description:
+				continue
+			match = matcher.search( task.description )
+			if match:
+				task.ticket = match.group()
+				changed += 1
+		if changed:
+			tasks_changed += changed
+			days_changed += 1
+			if not dry_run:
+				worklog.dump()
+	return tasks_changed, days_changed, time.perf_counter() - start
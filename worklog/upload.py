@@ -1,40 +1,283 @@
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import time
 
 from getpass import getpass
 from jira.client import JIRA
 
-from worklog.state import GoHome
+from worklog.issues import IssueCache
+from worklog.outbox import Outbox
+from worklog.session import LazyBasicAuth, SessionCache
+from worklog.state import Abort, GoHome, Worklog
 from worklog.time_utils import Duration
 
-def log_to_jira( worklog, config ):
-	jira = auth_jira( config )
-	print( 'Logging work ...' )
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1
+# every request is retried by the loops here (see _retryable), the client retrying each of those attempts on its own
+# would multiply the requests and the time spent backing off
+CLIENT_RETRIES = 0
+
+
+
+def _ticketed_segments( worklog ):
+	""" Yield each ticketed task along with how long it ran. """
 	if len( worklog ) > 0:
 		for task, next_task in worklog.pairwise():
 			if isinstance( task, GoHome ):
 				continue
-			if task.ticket and not task.logged:
+			if task.ticket:
 				duration = Duration( delta = next_task.start - task.start )
 				if not duration.seconds:
 					continue
-				started = '{}-{}-{}T{}:{}:00.000-0400'.format(
-					task.start.year,
-					task.start.month,
-					task.start.day,
-					task.start.hour,
-					task.start.minute
-				)
-				print( 'ticket', task.ticket )
-				ticket = jira.issue( task.ticket )
-				print( '\nLogging {} to ticket {}'.format( duration, ticket ) )
-				jira.add_worklog(
-					issue = ticket,
-					timeSpent = str( duration ),
-					started = datetime.strptime( started, '%Y-%m-%dT%H:%M:%S.000%z' )
-				)
-				task.logged = True
-	print( 'Done.' )
+				yield task, duration
+
+
+
+def _unlogged_segments( worklog ):
+	""" Yield each ticketed task that hasn't been logged yet along with how long it ran. """
+	for task, duration in _ticketed_segments( worklog ):
+		if not task.logged:
+			yield task, duration
+
+
+
+def _started( start ):
+	started = '{}-{}-{}T{}:{}:00.000-0400'.format(
+		start.year,
+		start.month,
+		start.day,
+		start.hour,
+		start.minute
+	)
+	return datetime.strptime( started, '%Y-%m-%dT%H:%M:%S.000%z' )
+
+
+
+def _retryable( error ):
+	status_code = getattr( error, 'status_code', None )
+	if status_code is not None:
+		return status_code == 429 or 500 <= status_code < 600
+	# connection problems, requests' exceptions are IOErrors
+	return isinstance( error, OSError )
+
+
+
+def _error_message( error ):
+	""" Just the gist of a failed request, jira's errors carry the whole response along. """
+	status_code = getattr( error, 'status_code', None )
+	if status_code is not None:
+		return 'HTTP {} {}'.format( status_code, getattr( error, 'text', '' ) or '' ).strip()
+	return str( error )
+
+
+
+def _post_worklog( jira, issues, item ):
+	""" Post an outbox item, returns how long the requests took in seconds. """
+	start = time.perf_counter()
+	ticket = issues.resolve( jira, item['ticket'] )
+	jira.add_worklog(
+		issue = ticket['key'],
+		timeSpent = str( Duration( timedelta( seconds = item['seconds'] ) ) ),
+		started = _started( datetime.fromisoformat( item['started'] ) )
+	)
+	return time.perf_counter() - start
+
+
+
+def _post_with_retry( jira, issues, outbox, item, retries, backoff ):
+	""" Post an outbox item, backing off exponentially on rate limiting and server errors, and checkpoint the result. """
+	attempts = item.get( 'attempts', 0 )
+	for attempt in range( retries + 1 ):
+		attempts += 1
+		try:
+			elapsed = _post_worklog( jira, issues, item )
+		except Exception as e:
+			if attempt == retries or not _retryable( e ):
+				outbox.failed( item, attempts, e )
+				raise
+			time.sleep( backoff * ( 2 ** attempt ) )
+		else:
+			outbox.done( item, attempts )
+			return elapsed
+
+
+
+def _drain( jira, config, outbox, items ):
+	""" Post outbox items through a pool of workers, returns the number that failed. """
+	concurrency = config.jira.get( 'concurrency' ) or DEFAULT_CONCURRENCY
+	retries = config.jira.get( 'retries', DEFAULT_RETRIES )
+	backoff = config.jira.get( 'backoff', DEFAULT_BACKOFF )
+	failed = 0
+	# every worker shares the one authenticated client (and its connection pool)
+	with IssueCache( config ) as issues, ThreadPoolExecutor( max_workers = concurrency ) as pool:
+		pending = { pool.submit( _post_with_retry, jira, issues, outbox, item, retries, backoff ): item for item in items }
+		for future in as_completed( pending ):
+			item = pending[future]
+			duration = Duration( timedelta( seconds = item['seconds'] ) )
+			try:
+				elapsed = future.result()
+			except Exception as e:
+				failed += 1
+				print( 'Failed to log {} to ticket {}: {}'.format( duration, item['ticket'], e ) )
+			else:
+				print( 'Logged {} to ticket {} ({:.0f}ms)'.format( duration, item['ticket'], elapsed * 1000 ) )
+	return failed
+
+
+
+def _mark_logged( worklog, outbox ):
+	for task in worklog:
+		if task.ticket and outbox.status( task ) == 'done':
+			task.logged = True
+
+
+
+def _coalesce( segments ):
+	""" Group segments by ticket, yielding the tasks for each ticket and their summed Duration.
+
+	Tickets come out in the order they were first worked on, the worklog is posted as starting with the first task.
+
+	"""
+	by_ticket = {}
+	for task, duration in segments:
+		tasks, delta = by_ticket.get( task.ticket, ( [], timedelta() ) )
+		tasks.append( task )
+		by_ticket[task.ticket] = ( tasks, delta + duration.delta )
+	for tasks, delta in by_ticket.values():
+		yield tasks, Duration( delta )
+
+
+
+def _entries( segments, config, coalesce = False ):
+	""" The tasks and Duration of each worklog to post for the segments. """
+	if coalesce or config.jira.get( 'coalesce' ):
+		return list( _coalesce( segments ) )
+	return [ ( [ task ], duration ) for task, duration in segments ]
+
+
+
+def log_to_jira( worklog, config, coalesce = False ):
+	jira = auth_jira( config )
+	print( 'Logging work ...' )
+	with Outbox( config ) as outbox:
+		# anything already in the outbox was queued by an earlier upload, it gets posted (or recognized as posted)
+		# below rather than queued a second time
+		segments = [ ( task, duration ) for task, duration in _unlogged_segments( worklog ) if outbox.status( task ) is None ]
+		for tasks, duration in _entries( segments, config, coalesce ):
+			outbox.enqueue( worklog.when, tasks, duration )
+		failed = _drain( jira, config, outbox, outbox.pending( worklog.when ) )
+		_mark_logged( worklog, outbox )
+	if failed:
+		print( 'Done, {:d} failed and will be retried on the next upload.'.format( failed ) )
+	else:
+		print( 'Done.' )
+
+
+
+def drain_outbox( config ):
+	""" Post everything still queued in the outbox, for any day, then mark the posted tasks as logged. """
+	jira = auth_jira( config )
+	with Outbox( config ) as outbox:
+		items = outbox.pending()
+		print( 'Draining {:d} queued worklogs ...'.format( len( items ) ) )
+		failed = _drain( jira, config, outbox, items )
+		for day in sorted( set( item['day'] for item in items ) ):
+			with Worklog( when = day, config = config ) as worklog:
+				_mark_logged( worklog, outbox )
+	if failed:
+		print( 'Done, {:d} failed and are still queued.'.format( failed ) )
+	else:
+		print( 'Done.' )
+
+
+
+def _fetch_worklogs( jira, ticket, retries, backoff ):
+	""" The worklogs on the server for `ticket`, backing off exponentially on rate limiting and server errors. """
+	for attempt in range( retries + 1 ):
+		try:
+			return jira.worklogs( ticket )
+		except Exception as e:
+			if attempt == retries or not _retryable( e ):
+				raise
+			time.sleep( backoff * ( 2 ** attempt ) )
+
+
+
+def _server_worklogs( jira, config, tickets ):
+	""" The ( ticket, started, seconds ) of every worklog already on the server for the tickets, one request per ticket. """
+	username = config.jira.get( 'username' )
+	concurrency = config.jira.get( 'concurrency' ) or DEFAULT_CONCURRENCY
+	retries = config.jira.get( 'retries', DEFAULT_RETRIES )
+	backoff = config.jira.get( 'backoff', DEFAULT_BACKOFF )
+	existing = set()
+	with ThreadPoolExecutor( max_workers = concurrency ) as pool:
+		fetched = pool.map( lambda ticket: _fetch_worklogs( jira, ticket, retries, backoff ), tickets )
+		for ticket, worklogs in zip( tickets, fetched ):
+			for worklog in worklogs:
+				author = getattr( worklog, 'author', None )
+				if username and author is not None and getattr( author, 'name', username ) != username:
+					continue
+				started = datetime.strptime( worklog.started, '%Y-%m-%dT%H:%M:%S.%f%z' )
+				existing.add( ( ticket, started, int( worklog.timeSpentSeconds ) ) )
+	return existing
+
+
+
+def reconcile( worklog_range, config, coalesce = False, dry_run = False ):
+	""" Compare the range's ticketed tasks with the worklogs already on the server and only post what's missing.
+
+	Unlogged tasks that turn out to be on the server are marked as logged. Tasks that are logged locally but aren't on
+	the server are reported, not posted, someone may have removed them on purpose.
+
+	"""
+	jira = auth_jira( config )
+	worklogs = list( worklog_range.worklogs() )
+	planned = []
+	for worklog in worklogs:
+		worklog.load()
+		for tasks, duration in _entries( list( _ticketed_segments( worklog ) ), config, coalesce ):
+			planned.append( ( worklog, tasks, duration ) )
+	tickets = sorted( set( tasks[0].ticket for _, tasks, _ in planned ) )
+	print( 'Fetching existing worklogs for {:d} tickets ...'.format( len( tickets ) ) )
+	try:
+		existing = _server_worklogs( jira, config, tickets )
+	except Exception as e:
+		print( 'Failed to fetch the existing worklogs, nothing was posted or marked as logged: {}'.format( _error_message( e ) ) )
+		raise Abort()
+	with Outbox( config ) as outbox:
+		missing = []
+		for worklog, tasks, duration in planned:
+			key = ( tasks[0].ticket, _started( tasks[0].start ), duration.seconds )
+			logged = all( task.logged or outbox.status( task ) == 'done' for task in tasks )
+			description = '{} {} {} to ticket {}'.format( worklog.when.isoformat(), tasks[0].start.strftime( '%H:%M' ), duration, tasks[0].ticket )
+			if key in existing:
+				print( '= {}'.format( description ) )
+				for task in tasks:
+					task.logged = True
+			elif logged:
+				print( '! {} is logged locally but not on the server'.format( description ) )
+			elif any( outbox.status( task ) for task in tasks ):
+				print( '~ {} is already queued'.format( description ) )
+			else:
+				print( '+ {}'.format( description ) )
+				missing.append( ( worklog, tasks, duration ) )
+		if dry_run:
+			print( 'Would post {:d} worklogs.'.format( len( missing ) ) )
+			return None
+		for worklog, tasks, duration in missing:
+			outbox.enqueue( worklog.when, tasks, duration )
+		days = set( worklog.when.isoformat() for worklog in worklogs )
+		failed = _drain( jira, config, outbox, [ item for item in outbox.pending() if item['day'] in days ] )
+		for worklog in worklogs:
+			_mark_logged( worklog, outbox )
+			worklog.dump()
+	if failed:
+		print( 'Done, {:d} failed and will be retried on the next upload.'.format( failed ) )
+	else:
+		print( 'Done.' )
 
 
 
@@ -46,12 +289,33 @@ def auth_jira( config ):
 
 
 
+def _connect( sessions, options, session_auth = None, **auth ):
+	""" A JIRA client for the server in `options`, reusing the session and server info from earlier runs. """
+	options['cookies'] = sessions.cookies
+	# the server info probe is only there to learn the server's version, which doesn't change between runs
+	jira = JIRA( options, get_server_info = False, max_retries = CLIENT_RETRIES, **auth )
+	if session_auth is not None:
+		jira._session.auth = session_auth
+	sessions.attach( jira )
+	if sessions.server_info is None:
+		sessions.remember_server_info( jira.server_info() )
+	sessions.restore_server_info( jira )
+	return jira
+
+
+
 def auth_jira_basic( config ):
 	options = { 'server': config.jira.server or  input( '\nJira Server: ' ) }
 	username = config.jira.username or input( '\nJira Username: ' )
-	password = config.jira.password or getpass()
-	auth = ( username, password )
-	return JIRA( options, basic_auth = auth )
+	password = lambda: config.jira.password or getpass()
+	if config.jira.get( 'reuse_session', True ) is False:
+		return JIRA( options, basic_auth = ( username, password() ), max_retries = CLIENT_RETRIES )
+	# with a cached session the password is only needed (and prompted for) if the server has expired it
+	sessions = SessionCache( config, options['server'] ).load()
+	auth = LazyBasicAuth( username, password )
+	if not sessions.cookies:
+		auth.authenticate()
+	return _connect( sessions, options, session_auth = auth )
 
 
 
@@ -66,4 +330,6 @@ def auth_jira_oauth( config ):
 	}
 	options = { 'server': config.jira.server or  input( '\nJira Server: ' ) }
 	username = config.jira.username or input( '\nJira Username: ' )
-	return JIRA( options = options, oauth = oauth_dict )
+	if config.jira.get( 'reuse_session', True ) is False:
+		return JIRA( options = options, oauth = oauth_dict, max_retries = CLIENT_RETRIES )
+	return _connect( SessionCache( config, options['server'] ).load(), options, oauth = oauth_dict )
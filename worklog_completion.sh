@@ -1,26 +1,82 @@
 
+_worklog_aliases(){
+	# the alias list worklog keeps up to date whenever the config changes, only ask python when it's out of date
+	local cache=~/.worklog/completion/aliases
+	if [[ -f $cache && ! ~/.worklog/config.json -nt $cache ]]; then
+		echo $(< "$cache")
+	else
+		python3 -m worklog.alias
+	fi
+}
+
+_worklog_descriptions(){
+	# recent task descriptions, one per line, written whenever today's worklog is saved
+	local cache=~/.worklog/completion/descriptions
+	local aliases=( $( _worklog_aliases ) )
+	local descriptions
+	[[ -f $cache ]] && descriptions="$(< "$cache")"
+	local IFS=$'\n'
+	COMPREPLY=( $( compgen -W "${descriptions}"$'\n'"${aliases[*]}" -- "$1" ) )
+	# printf with nothing to print still prints one (quoted empty) word
+	if (( ${#COMPREPLY[@]} )); then
+		COMPREPLY=( $( printf '%q\n' "${COMPREPLY[@]}" ) )
+	fi
+}
+
 _worklog(){
 	local options
-	local aliases=$( python3 -m worklog.alias )
+	local current="${COMP_WORDS[COMP_CWORD]}"
+	local previous="${COMP_WORDS[COMP_CWORD-1]}"
 
 	case "${COMP_WORDS[1]}" in
 		start)
+			case "$previous" in
+				--ago|--at|--day|-d|--ticket|-t)
+					;;
+				*)
+					if [[ $current != -* ]]; then
+						_worklog_descriptions "$current"
+						return
+					fi
+					;;
+			esac
 			options="--ago --at --day --ticket"
 			;;
-		stop|resume)
+		resume)
+			if [[ $previous == --search ]]; then
+				_worklog_descriptions "$current"
+				return
+			fi
+			options="--ago --at --day --search"
+			;;
+		stop)
 			options="--ago --at --day"
 			;;
-		report|upload)
+		report)
+			options="--day --from --to --summary --cache-stats"
+			;;
+		upload)
+			options="--day --coalesce --drain --foreground --reconcile --dry-run --from --to"
+			;;
+		compact)
 			options="--day"
 			;;
+		status)
+			options="--format"
+			;;
+		backfill-tickets)
+			options="--from --to --dry-run"
+			;;
+		search)
+			options="--limit"
+			;;
 		*)
-			options="start stop resume report upload"
+			options="start stop resume report status search upload compact migrate reindex backfill-tickets daemon"
 			;;
 	esac
-	options="${options} $aliases"
+	options="${options} $( _worklog_aliases )"
 
-	COMPREPLY=( $( compgen -W "--help ${options}" -- "${COMP_WORDS[COMP_CWORD]}" ) )
+	COMPREPLY=( $( compgen -W "--help ${options}" -- "$current" ) )
 }
 
 complete -F _worklog worklog
-